@@ -6,7 +6,12 @@ DAG and Submit File Editor for EMWOS Workflow Scheduling
 This script processes workflow DAG files based on a scheduling CSV file to:
 1. Add PRE/POST script commands with execution numbers and preference for each job
 2. Optionally remove priority settings from both DAG and submit files
-3. Create backups of all modified files
+3. Keep a single pristine snapshot of every file it modifies
+4. Record what was applied in a per-workflow manifest so re-runs are incremental
+5. Optionally (-static) pin every job to its scheduled resource directly in the submit
+   files instead of going through the PRE/POST allocator hook
+6. Optionally (--throttle) bound the number of queued jobs per preference with DAGMan
+   CATEGORY/MAXJOBS settings sized to each preference's resource pool
 
 Input Requirements:
 -----------------
@@ -15,19 +20,46 @@ Input Requirements:
    - job_name: Name of the job
    - execution_number: Scheduling order number
    - preference: Performance preference for the job (optional)
+   - assigned_resource: Slot chosen by the scheduler (required for -static)
    - [other columns are ignored]
 
 Operations Performed:
 ------------------
 1. For each workflow in the schedule:
    - Locates the DAG file in the workflow folder
+   - Snapshots the original DAG into .emwos-pristine/ (only the first time)
    - Adds PRE/POST script lines with execution numbers and preference (if available)
    - Removes PRIORITY lines if -rm-prio flag is used
-   - Creates backup as .dag.bak
+   - Writes .emwos-manifest.json with the schedule hash, DAG hash and submit-file hashes
 
 2. For submit files (if -rm-prio is used):
-   - Removes priority lines from all submit files
-   - Creates backup as .sub.bak
+   - Snapshots the original submit file into .emwos-pristine/ (only the first time)
+   - Removes priority lines from submit files that still carry them
+
+3. On a re-run over an already edited workflow:
+   - Same schedule and options: nothing is rewritten
+   - Changed execution numbers or preferences: only the affected SCRIPT PRE lines are patched
+   - DAG edited outside this script or options changed: the DAG is rebuilt from the pristine snapshot
+   - DAG regenerated (no EMWOS marker line): it becomes the new pristine original, and so
+     does every tracked submit file that no longer matches what this script wrote
+   - Submit files whose recorded size and content hash still match the manifest are not touched
+
+4. Static allocation (-static):
+   - No PRE/POST scripts are added; the original pegasus-exitcode POST lines are kept
+   - DAG PRIORITY lines are replaced by PRIORITY <job> -<execution_number>
+   - Each submit file gets requirements = (Name == "<assigned_resource>") and
+     priority = -<execution_number>; jobs the allocator hook skips (create_/stage_in_/
+     stage_out_) only get the priority
+
+5. Throttling (--throttle resource_file):
+   - Every job the allocator handles gets CATEGORY <job> emwos_<preference>
+     (jobs that already have a Pegasus category such as stagein keep it)
+   - Each DAG gets MAXJOBS emwos_<preference> <n>, where n is the preference's slot pool
+     (same rules as emwos-allocator: performance = all nodes, balanced = first half of
+     the nodes, energy = first node) divided between the workflows sharing that preference
+
+6. Restore (--restore):
+   - Copies every file in .emwos-pristine/ back over the edited file and removes the manifest
 
 Usage:
 -----
@@ -37,13 +69,26 @@ Basic usage:
 Remove priority settings:
     python3 dag_editor.py -s schedule.csv -rm-prio
 
+Pin jobs to their scheduled slots without the allocator (static dispatch):
+    python3 dag_editor.py -s schedule.csv -static
+
+Bound DAGMan submissions by each preference's slot pool:
+    python3 dag_editor.py -s schedule.csv -rm-prio --throttle resource.txt
+
+Restore workflow folders to their original state:
+    python3 dag_editor.py --restore /path/to/run0086 /path/to/run0087
+
 Arguments:
 ---------
-Required:
+Required (one of):
     -s, --schedule    Path to the schedule CSV file
+    --restore         Workflow folder(s) to restore from the pristine snapshot
 
 Optional:
     -rm-prio         Remove priority lines from both DAG and submit files
+    -static          Bake assigned resources and ordering into the submit files, no PRE/POST scripts
+    --throttle       Resource file used to size per-preference CATEGORY/MAXJOBS throttles
+                     (-throttle is accepted too)
 
 Example Schedule CSV:
 ------------------
@@ -59,19 +104,23 @@ Output:
    SCRIPT PRE job_name emwos-pre-post.sh pre submit_file.sub execution_number preference
    SCRIPT POST job_name emwos-pre-post.sh post submit_file.sub
 
-2. Backup files:
-   - Original DAG: filename.dag.bak
-   - Original submit files: filename.sub.bak
+2. Pristine snapshot (per workflow folder):
+   - .emwos-pristine/<dag file> and .emwos-pristine/<submit file path>
+
+3. Manifest (per workflow folder):
+   - .emwos-manifest.json
 
-3. Console output:
+4. Console output:
    - Processing status for each workflow
-   - Location of backup files
+   - Number of DAG lines patched and submit files rewritten
    - Summary of successful/failed operations
 
 Error Handling:
 -------------
-- Creates backups before modifications
-- Attempts to restore from backup if errors occur
+- Snapshots originals before the first modification
+- Writes every file through a temporary file and an atomic rename
+- Refuses to edit a DAG that already carries SCRIPT PRE lines or the EMWOS marker but has
+  no pristine original
 - Reports specific errors for each file
 - Non-zero exit code if any workflow fails
 
@@ -85,11 +134,21 @@ import sys
 import os
 import argparse
 import csv
+import hashlib
+import json
+import math
 from collections import defaultdict
 from pathlib import Path
-import subprocess
 import shutil
 
+MANIFEST_FILE = '.emwos-manifest.json'
+PRISTINE_DIR = '.emwos-pristine'
+MANIFEST_VERSION = 2
+# Comment line render_dag adds to every DAG it writes, static mode included
+EDIT_MARKER = '# EMWOS-EDITED'
+# Preference the allocator hook falls back to when a job has none (DEFAULT_PREFERENCE)
+DEFAULT_PREFERENCE = 'balanced'
+
 def read_schedule(csv_file):
     """Read the schedule CSV file and organize job information by workflow."""
     workflow_jobs = defaultdict(dict)
@@ -118,7 +177,8 @@ def read_schedule(csv_file):
                 
                 workflow_jobs[workflow_folder][job_name] = {
                     'exec_num': exec_num,
-                    'preference': preference
+                    'preference': preference,
+                    'assigned_resource': row.get('assigned_resource')
                 }
             
             if not has_preference:
@@ -146,174 +206,590 @@ def find_dag_file(workflow_folder):
         print(f"Error accessing workflow folder {workflow_folder}: {e}")
         return None
 
-def remove_priority_from_submit(submit_file):
-    """Remove priority lines from submit files."""
-    try:
-        with open(submit_file, 'r') as f:
-            lines = f.readlines()
-        
-        new_lines = [line for line in lines if not line.strip().startswith('priority')]
-        
-        # Create backup of submit file
-        backup_file = f"{submit_file}.bak"
-        os.rename(submit_file, backup_file)
-        
-        with open(submit_file, 'w') as f:
-            f.writelines(new_lines)
-            
-        print(f"Removed priority from submit file: {submit_file}")
-        print(f"Submit file backup created at: {backup_file}")
-        return True
-    except Exception as e:
-        print(f"Error processing submit file {submit_file}: {e}")
-        return False
-
 def get_absolute_submit_path(dag_dir, submit_file):
     """Convert submit file path to absolute path."""
     if os.path.isabs(submit_file):
         return submit_file
     return os.path.abspath(os.path.join(dag_dir, submit_file))
 
-def edit_dag_file(dag_file, job_info, remove_priority):
-    """Edit the DAG file to add PRE/POST scripts with execution numbers and preference."""
-    backup_file = f"{dag_file}.bak"
+def read_resources(resource_file):
+    """Read resource file containing slot definitions."""
+    try:
+        with open(resource_file, 'r') as f:
+            resources = [line.strip() for line in f if line.strip()]
+    except (FileNotFoundError, IOError) as e:
+        print(f"Error reading resource file: {e}")
+        sys.exit(1)
+    if not resources:
+        print(f"Error: Resource file '{resource_file}' is empty")
+        sys.exit(1)
+    return resources
+
+def preference_pool_sizes(resources):
+    """Number of slots emwos-allocator lets each preference use (see FindNextResourceToScheduleTheJobOn)."""
+    nodes = list(dict.fromkeys(resource.split('@')[1] for resource in resources))
+    balanced_nodes = set(nodes[:math.ceil(len(nodes) / 2)])
+    return {
+        'performance': len(resources),
+        'balanced': sum(1 for resource in resources if resource.split('@')[1] in balanced_nodes),
+        'energy': sum(1 for resource in resources if resource.split('@')[1] == nodes[0])
+    }
+
+def throttle_limits(workflow_jobs, resources):
+    """
+    MAXJOBS per workflow and preference.
+
+    A preference's pool is shared by all workflows using it, so each of them gets an even share.
+    """
+    pool_sizes = preference_pool_sizes(resources)
+    workflow_preferences = {folder: {job_data['preference'] or DEFAULT_PREFERENCE for job_data in job_info.values()}
+                            for folder, job_info in workflow_jobs.items()}
+    sharing = defaultdict(int)
+    for preferences in workflow_preferences.values():
+        for preference in preferences:
+            sharing[preference] += 1
+
+    limits = {}
+    for folder, preferences in workflow_preferences.items():
+        limits[folder] = {
+            preference: max(1, math.ceil(pool_sizes.get(preference, pool_sizes['performance']) / sharing[preference]))
+            for preference in sorted(preferences)
+        }
+    return limits
+
+def throttle_category(job_data):
+    """DAGMan category of a throttled job."""
+    return f"emwos_{job_data['preference'] or DEFAULT_PREFERENCE}"
+
+def hash_bytes(data):
+    """Return the sha256 hex digest of a bytes object."""
+    return hashlib.sha256(data).hexdigest()
+
+def file_fingerprint(path, data=None):
+    """Return the hash and size of a file as stored in the manifest."""
+    if data is None:
+        with open(path, 'rb') as f:
+            data = f.read()
+    return {'sha256': hash_bytes(data), 'size': len(data)}
+
+def fingerprint_matches(path, recorded):
+    """
+    Check that a file is still the one recorded in the manifest.
+
+    The size rejects most changed files without reading them; otherwise the content hash
+    decides, since a file rewritten at the same size may also keep its mtime.
+    """
+    if not recorded:
+        return False
+    try:
+        if os.stat(path).st_size != recorded['size']:
+            return False
+        with open(path, 'rb') as f:
+            return hash_bytes(f.read()) == recorded['sha256']
+    except OSError:
+        return False
+
+def schedule_hash(job_info, options):
+    """Hash the part of the schedule that ends up in one workflow's files."""
+    payload = json.dumps({'jobs': job_info, 'options': options}, sort_keys=True)
+    return hash_bytes(payload.encode())
+
+def write_atomic(path, data):
+    """Write bytes to path through a temporary file and an atomic rename."""
+    tmp_file = f"{path}.emwos-tmp"
+    with open(tmp_file, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_file, path)
+
+def load_manifest(workflow_folder):
+    """Load the manifest of a workflow folder, or None if there is no usable one."""
+    manifest_file = os.path.join(workflow_folder, MANIFEST_FILE)
+    try:
+        with open(manifest_file, 'r') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (json.JSONDecodeError, OSError) as e:
+        print(f"Warning: Ignoring unreadable manifest {manifest_file}: {e}")
+        return None
+    if manifest.get('version') != MANIFEST_VERSION:
+        print(f"Warning: Ignoring manifest {manifest_file} with unsupported version {manifest.get('version')}")
+        return None
+    return manifest
+
+def write_manifest(workflow_folder, manifest):
+    """Write the manifest of a workflow folder."""
+    manifest['version'] = MANIFEST_VERSION
+    data = json.dumps(manifest, indent=1, sort_keys=True).encode()
+    write_atomic(os.path.join(workflow_folder, MANIFEST_FILE), data)
+
+def get_pristine_path(workflow_folder, path):
+    """Location of the pristine snapshot of a file belonging to a workflow folder."""
+    rel_path = os.path.relpath(path, workflow_folder)
+    if rel_path.startswith(os.pardir):
+        # Submit files outside the workflow folder keep their absolute layout
+        rel_path = os.path.join('_abs', os.path.abspath(path).lstrip(os.sep))
+    return os.path.join(workflow_folder, PRISTINE_DIR, rel_path)
+
+def snapshot_pristine(workflow_folder, path, source=None):
+    """Copy the original file into the pristine snapshot unless it is already there."""
+    pristine_file = get_pristine_path(workflow_folder, path)
+    if not os.path.exists(pristine_file):
+        os.makedirs(os.path.dirname(pristine_file), exist_ok=True)
+        shutil.copy2(source or path, pristine_file)
+    return pristine_file
+
+def refresh_pristine(workflow_folder, path, data):
+    """Replace the pristine snapshot of a file by new original content."""
+    pristine_file = get_pristine_path(workflow_folder, path)
+    os.makedirs(os.path.dirname(pristine_file), exist_ok=True)
+    write_atomic(pristine_file, data)
+
+def is_edited_dag(lines):
+    """
+    Pegasus never writes SCRIPT PRE lines or the EMWOS marker, so either means the DAG was
+    already edited (SCRIPT PRE alone covers DAGs edited before the marker existed).
+    """
+    return any(line.startswith('SCRIPT PRE ') or line.rstrip() == EDIT_MARKER for line in lines)
+
+def read_pristine_dag(workflow_folder, dag_file, current_lines):
+    """Return the lines of the original DAG, taking the snapshot on first use."""
+    pristine_file = get_pristine_path(workflow_folder, dag_file)
+    if not os.path.exists(pristine_file):
+        lines = current_lines
+        source = dag_file
+        if is_edited_dag(lines):
+            # Edited by an older version of this script, which left a .dag.bak behind
+            legacy_backup = f"{dag_file}.bak"
+            if not os.path.exists(legacy_backup):
+                raise RuntimeError(f"{dag_file} is already edited and no pristine copy exists")
+            with open(legacy_backup, 'r') as f:
+                lines = f.readlines()
+            if is_edited_dag(lines):
+                raise RuntimeError(f"{legacy_backup} is already edited; restore the original DAG manually")
+            source = legacy_backup
+        snapshot_pristine(workflow_folder, dag_file, source)
+        print(f"DAG pristine snapshot created at: {pristine_file}")
+        return lines
+    with open(pristine_file, 'r') as f:
+        return f.readlines()
+
+def read_pristine_submit(workflow_folder, submit_file):
+    """Return the lines of the original submit file (pristine snapshot if taken)."""
+    pristine_file = get_pristine_path(workflow_folder, submit_file)
+    if not os.path.exists(pristine_file):
+        pristine_file = submit_file
+        # Submit files edited by an older version of this script have a .sub.bak
+        if os.path.exists(f"{submit_file}.bak"):
+            pristine_file = f"{submit_file}.bak"
+    with open(pristine_file, 'r') as f:
+        return f.readlines()
+
+def is_hook_skipped(job_name):
+    """Jobs the emwos-pre-post hook never sends to the allocator (see shouldSkipJob)."""
+    return job_name.startswith(('create_', 'stage_in_', 'stage_out_'))
+
+def static_priority(job_data):
+    """Priority used in static mode so that lower execution numbers are dispatched first."""
+    try:
+        return -int(job_data['exec_num'])
+    except (TypeError, ValueError):
+        return None
+
+def submit_spec(job_name, job_data, options):
+    """Describe the edits a job's submit file needs under the given options."""
+    spec = {}
+    if options['static']:
+        priority = static_priority(job_data)
+        if priority is not None:
+            spec['priority'] = priority
+        resource = job_data.get('assigned_resource')
+        if resource and not is_hook_skipped(job_name):
+            spec['requirements'] = resource
+    elif options['remove_priority']:
+        spec['remove_priority'] = True
+    return spec
+
+def render_submit(lines, spec):
+    """Apply the edits described by spec to the lines of an original submit file."""
+    if spec.get('remove_priority') or 'priority' in spec:
+        lines = [line for line in lines if not line.strip().startswith('priority')]
+    if 'requirements' in spec:
+        lines = [line for line in lines if not line.strip().lower().startswith('requirements')]
+
+    extra = []
+    if 'requirements' in spec:
+        extra.append(f'requirements = (Name == "{spec["requirements"]}")\n')
+    if 'priority' in spec:
+        extra.append(f"priority = {spec['priority']}\n")
+    if extra:
+        # New commands must come before the queue statement
+        queue_index = next((i for i, line in enumerate(lines) if line.strip().startswith('queue')), len(lines))
+        lines = lines[:queue_index] + extra + lines[queue_index:]
+    return lines
+
+def sync_submit_file(workflow_folder, submit_file, spec, recorded):
+    """
+    Bring one submit file in line with spec.
+
+    Returns the manifest entry for the file and whether it was rewritten.
+    """
+    if recorded and recorded.get('spec') == spec and fingerprint_matches(submit_file, recorded):
+        return recorded, False
+
+    with open(submit_file, 'rb') as f:
+        current = f.read()
+    desired = ''.join(render_submit(read_pristine_submit(workflow_folder, submit_file), spec)).encode()
+
+    rewritten = False
+    if desired != current:
+        snapshot_pristine(workflow_folder, submit_file,
+                          f"{submit_file}.bak" if os.path.exists(f"{submit_file}.bak") else None)
+        write_atomic(submit_file, desired)
+        current = desired
+        rewritten = True
+
+    entry = file_fingerprint(submit_file, current)
+    entry['spec'] = spec
+    return entry, rewritten
+
+def pre_script_line(job_name, emwos_script, submit_file, job_data):
+    """Construct the SCRIPT PRE line for a job."""
+    exec_num = job_data['exec_num']
+    preference = job_data['preference']
+    # Construct PRE script line based on whether preference is available
+    if preference is not None:
+        return f"SCRIPT PRE {job_name} {emwos_script} pre {submit_file} {exec_num} {preference}\n"
+    return f"SCRIPT PRE {job_name} {emwos_script} pre {submit_file} {exec_num}\n"
+
+def render_dag(lines, job_info, options, emwos_script):
+    """
+    Edit the lines of an original DAG to add PRE/POST scripts with execution numbers and preference.
+
+    In static mode no scripts are added and the node PRIORITY follows the execution number.
+    Returns the new lines and the submit file of every job, as written in the DAG.
+    """
+    static = options['static']
+    maxjobs = options['maxjobs']
+    output = lines[:10]  # Keep the first 10 lines unchanged
+    output.append(f"{EDIT_MARKER}\n")
+    job_submit_files = {}
+
+    if maxjobs:
+        # Jobs keep a category Pegasus already gave them (a node has only one)
+        categorised = {line.split()[1] for line in lines if line.startswith('CATEGORY ')}
+        # Throttles go next to the Pegasus MAXJOBS lines of the header
+        insert_at = max((i + 1 for i, line in enumerate(output) if line.startswith('MAXJOBS ')), default=len(output))
+        output[insert_at:insert_at] = [f"MAXJOBS emwos_{preference} {limit}\n" for preference, limit in maxjobs.items()]
+
+    for line in lines[10:]:
+        if line.startswith('JOB '):
+            parts = line.split()
+            if len(parts) < 3:
+                print(f"Warning: Invalid JOB line: {line}")
+                output.append(line)
+                continue
+
+            current_job = parts[1]
+            submit_file = parts[2]
+            job_submit_files[current_job] = submit_file
+            job_data = job_info.get(current_job, {"exec_num": "UNKNOWN", "preference": None})
+
+            output.append(line)
+            if static:
+                priority = static_priority(job_data)
+                if priority is not None:
+                    output.append(f"PRIORITY {current_job} {priority}\n")
+            else:
+                output.append(pre_script_line(current_job, emwos_script, submit_file, job_data))
+                output.append(f"SCRIPT POST {current_job} {emwos_script} post {submit_file}\n")
+            if maxjobs and current_job in job_info and current_job not in categorised and not is_hook_skipped(current_job):
+                output.append(f"CATEGORY {current_job} {throttle_category(job_data)}\n")
+
+        elif line.startswith('SCRIPT POST '):
+            # Skip the old POST line, unless there is no emwos POST script to replace it
+            if static:
+                output.append(line)
+        elif line.startswith('PRIORITY'):
+            if not static and not options['remove_priority']:
+                output.append(line)
+        else:
+            output.append(line)
+
+    return output, job_submit_files
+
+def patch_dag(lines, job_info, changed_jobs):
+    """Rewrite only the SCRIPT PRE lines of jobs whose execution number or preference changed."""
+    patched = 0
+    job_submit_files = {}
+    for i, line in enumerate(lines):
+        if line.startswith('JOB '):
+            parts = line.split()
+            if len(parts) >= 3:
+                job_submit_files[parts[1]] = parts[2]
+        elif line.startswith('SCRIPT PRE '):
+            parts = line.split()
+            job_name = parts[2]
+            if job_name in changed_jobs:
+                job_data = job_info.get(job_name, {"exec_num": "UNKNOWN", "preference": None})
+                lines[i] = pre_script_line(job_name, parts[3], parts[5], job_data)
+                patched += 1
+    return lines, job_submit_files, patched
+
+def preferences_changed(job_info, old_jobs):
+    """True if a job moved to another preference (and so to another throttle category)."""
+    return (set(job_info) != set(old_jobs)
+            or any(job_info[job]['preference'] != old_jobs[job]['preference'] for job in job_info))
+
+def apply_workflow(workflow_folder, job_info, options, emwos_script, dag_source=None):
+    """
+    Bring one workflow folder in line with its part of the schedule.
+
+    dag_source is an optional (dag_file, content) pair already read by a scheduler,
+    which saves reading and splitting the DAG a second time.
+    """
+    if dag_source is not None:
+        dag_file, dag_text = dag_source
+    else:
+        dag_file, dag_text = find_dag_file(workflow_folder), None
+        if not dag_file:
+            return False
+
     dag_dir = os.path.dirname(dag_file)
-    submit_files_processed = set()
-    
+    manifest = load_manifest(workflow_folder)
+    new_hash = schedule_hash(job_info, options)
+    regenerated = False
+
     try:
-        # Create backup
-        os.rename(dag_file, backup_file)
-
-        with open(backup_file, 'r') as infile, open(dag_file, 'w') as outfile:
-            # Keep the first 10 lines unchanged
-            for _ in range(10):
-                line = infile.readline()
-                outfile.write(line)
-
-            # Process the rest of the file
-            current_job = None
-            for line in infile:
-                if line.startswith('JOB '):
-                    parts = line.split()
-                    if len(parts) < 3:
-                        print(f"Warning: Invalid JOB line in {dag_file}: {line}")
-                        outfile.write(line)
-                        continue
-                        
-                    current_job = parts[1]
-                    submit_file = parts[2]
-                    
-                    job_data = job_info.get(current_job, {"exec_num": "UNKNOWN", "preference": None})
-                    exec_num = job_data['exec_num']
-                    preference = job_data['preference']
-                    
-                    # Get absolute path of submit file
-                    abs_submit_path = get_absolute_submit_path(dag_dir, submit_file)
-                    
-                    # Remove priority from submit file if needed
-                    if remove_priority and abs_submit_path not in submit_files_processed:
-                        if os.path.exists(abs_submit_path):
-                            if remove_priority_from_submit(abs_submit_path):
-                                submit_files_processed.add(abs_submit_path)
-                        else:
-                            print(f"Warning: Submit file not found: {abs_submit_path}")
-                    
-                    outfile.write(line)
-                    # get the full path using OS which command for the script
-                    emwos_script = shutil.which('emwos-pre-post')
-                    if emwos_script is None:
-                        raise FileNotFoundError("emwos-pre-post script not found in PATH")
-
-                    # Construct PRE script line based on whether preference is available
-                    if preference is not None:
-                        pre_script = f"SCRIPT PRE {current_job} {emwos_script} pre {submit_file} {exec_num} {preference}\n"
-                    else:
-                        pre_script = f"SCRIPT PRE {current_job} {emwos_script} pre {submit_file} {exec_num}\n"
-                        
-                    outfile.write(pre_script)
-                    outfile.write(f"SCRIPT POST {current_job} {emwos_script} post {submit_file}\n")
-                
-                elif line.startswith('SCRIPT POST '):
-                    # Skip the old POST line
-                    continue
-                elif line.startswith('PRIORITY'):
-                    if not remove_priority:
-                        outfile.write(line)
+        if dag_text is not None:
+            current_dag = dag_text.encode()
+        else:
+            with open(dag_file, 'rb') as f:
+                current_dag = f.read()
+
+        dag_matches = (manifest is not None
+                       and manifest.get('dag_file') == os.path.basename(dag_file)
+                       and manifest.get('dag_hash') == hash_bytes(current_dag))
+
+        if dag_matches and manifest['schedule_hash'] == new_hash:
+            print(f"Schedule already applied to DAG file: {dag_file}")
+            lines = current_dag.decode().splitlines(keepends=True)
+            _, job_submit_files, _ = patch_dag(lines, job_info, set())
+        elif (dag_matches and manifest['options'] == options and not options['static']
+              and not (options['maxjobs'] and preferences_changed(job_info, manifest['jobs']))):
+            old_jobs = manifest['jobs']
+            changed_jobs = {job for job in set(job_info) | set(old_jobs)
+                            if job_info.get(job) != old_jobs.get(job)}
+            lines = current_dag.decode().splitlines(keepends=True)
+            lines, job_submit_files, patched = patch_dag(lines, job_info, changed_jobs)
+            write_atomic(dag_file, ''.join(lines).encode())
+            print(f"Patched {patched} SCRIPT PRE line(s) in DAG file: {dag_file}")
+        else:
+            current_lines = current_dag.decode().splitlines(keepends=True)
+            if manifest is not None and not dag_matches:
+                # Our edits always leave the marker, so a DAG without it was regenerated and is
+                # the new original (manifests from before the marker only know about SCRIPT PRE)
+                if not is_edited_dag(current_lines) and (manifest.get('marked')
+                                                         or not manifest['options'].get('static')):
+                    refresh_pristine(workflow_folder, dag_file, current_dag)
+                    regenerated = True
+                    print(f"Warning: {dag_file} was regenerated. Replaced its pristine snapshot.")
                 else:
-                    outfile.write(line)
+                    print(f"Warning: {dag_file} changed since it was last edited. Rebuilding from pristine snapshot.")
+            lines, job_submit_files = render_dag(
+                read_pristine_dag(workflow_folder, dag_file, current_lines), job_info, options, emwos_script)
+            write_atomic(dag_file, ''.join(lines).encode())
+            print(f"Processed DAG file: {dag_file}")
+
+        # Submit files referenced by the DAG
+        old_submits = manifest.get('submit_files', {}) if manifest else {}
+        submit_manifest = {}
+        rewritten = 0
+        for job_name, submit_file in job_submit_files.items():
+            spec = submit_spec(job_name, job_info.get(job_name, {}), options)
+            abs_submit_path = get_absolute_submit_path(dag_dir, submit_file)
+            recorded = old_submits.get(submit_file)
+            if not os.path.exists(abs_submit_path):
+                print(f"Warning: Submit file not found: {abs_submit_path}")
+                continue
+            if regenerated and recorded is not None and not fingerprint_matches(abs_submit_path, recorded):
+                # Regenerated along with the DAG: the new file is the original now
+                with open(abs_submit_path, 'rb') as f:
+                    refresh_pristine(workflow_folder, abs_submit_path, f.read())
+                recorded = None
+            if not spec and recorded is None:
+                # Never edited and nothing to edit
+                continue
+            entry, changed = sync_submit_file(workflow_folder, abs_submit_path, spec, recorded)
+            submit_manifest[submit_file] = entry
+            rewritten += changed
+
+        write_manifest(workflow_folder, {
+            'dag_file': os.path.basename(dag_file),
+            'dag_hash': hash_bytes(''.join(lines).encode()),
+            'marked': any(line.rstrip() == EDIT_MARKER for line in lines),
+            'schedule_hash': new_hash,
+            'options': options,
+            'jobs': job_info,
+            'submit_files': submit_manifest
+        })
 
-        print(f"Processed DAG file: {dag_file}")
-        print(f"DAG file backup created at: {backup_file}")
-        print(f"Processed {len(submit_files_processed)} submit files")
+        print(f"Rewrote {rewritten} of {len(submit_manifest)} tracked submit files")
         return True
 
     except Exception as e:
         print(f"Error processing DAG file {dag_file}: {e}")
-        # Try to restore backup if something went wrong
-        if os.path.exists(backup_file):
-            try:
-                os.replace(backup_file, dag_file)
-                print(f"Restored original DAG file from backup")
-            except Exception as restore_error:
-                print(f"Error restoring backup: {restore_error}")
+        print(f"Originals are kept in: {os.path.join(workflow_folder, PRISTINE_DIR)}")
         return False
 
-def process_workflows(schedule_file, remove_priority):
-    """Process all workflows from the schedule."""
-    # Read the schedule
-    workflow_jobs = read_schedule(schedule_file)
-    
+def restore_workflow(workflow_folder):
+    """Copy every file of the pristine snapshot back over the edited file."""
+    pristine_root = os.path.join(workflow_folder, PRISTINE_DIR)
+    if not os.path.isdir(pristine_root):
+        print(f"Error: No pristine snapshot found in {workflow_folder}")
+        return False
+
+    restored = 0
+    try:
+        for root, _, files in os.walk(pristine_root):
+            for name in files:
+                pristine_file = os.path.join(root, name)
+                rel_path = os.path.relpath(pristine_file, pristine_root)
+                if rel_path.startswith('_abs' + os.sep):
+                    target = os.sep + rel_path[len('_abs' + os.sep):]
+                else:
+                    target = os.path.join(workflow_folder, rel_path)
+                shutil.copy2(pristine_file, target)
+                restored += 1
+
+        manifest_file = os.path.join(workflow_folder, MANIFEST_FILE)
+        if os.path.exists(manifest_file):
+            os.remove(manifest_file)
+    except Exception as e:
+        print(f"Error restoring {workflow_folder}: {e}")
+        return False
+
+    print(f"Restored {restored} file(s) in {workflow_folder}")
+    return True
+
+def apply_workflows(workflow_jobs, remove_priority, dag_sources=None, static=False, resources=None):
+    """
+    Apply in-memory schedule information ({folder: {job: {exec_num, preference, assigned_resource}}})
+    to all workflows.
+
+    dag_sources optionally maps a workflow folder to the (dag_file, content) pair it was parsed from.
+    resources (list of slots) turns on the per-preference CATEGORY/MAXJOBS throttles.
+    """
+    dag_sources = dag_sources or {}
+    limits = throttle_limits(workflow_jobs, resources) if resources else {}
+
+    emwos_script = None
+    if static:
+        missing = sum(1 for job_info in workflow_jobs.values()
+                      for job_data in job_info.values() if not job_data.get('assigned_resource'))
+        if missing:
+            print(f"Warning: {missing} job(s) have no assigned_resource and will not be pinned to a slot")
+    else:
+        # The assigned resource is only used in static mode
+        workflow_jobs = {folder: {job: {'exec_num': data['exec_num'], 'preference': data['preference']}
+                                  for job, data in job_info.items()}
+                         for folder, job_info in workflow_jobs.items()}
+        # get the full path using OS which command for the script
+        emwos_script = shutil.which('emwos-pre-post')
+        if emwos_script is None:
+            print("Error: emwos-pre-post script not found in PATH")
+            return 0, len(workflow_jobs)
+
     successful = 0
     failed = 0
-    total_submit_files = 0
-    
+
     # Process each workflow
     for workflow_folder, job_info in workflow_jobs.items():
         print(f"\nProcessing workflow: {workflow_folder}")
-        
-        # Find DAG file
-        dag_file = find_dag_file(workflow_folder)
-        if not dag_file:
-            print(f"Skipping workflow folder: {workflow_folder}")
-            failed += 1
-            continue
-            
-        # Edit the DAG file
-        if edit_dag_file(dag_file, job_info, remove_priority):
+
+        options = {'remove_priority': remove_priority, 'static': static,
+                   'maxjobs': limits.get(workflow_folder)}
+        if apply_workflow(workflow_folder, job_info, options, emwos_script,
+                          dag_sources.get(workflow_folder)):
             successful += 1
         else:
+            print(f"Skipping workflow folder: {workflow_folder}")
             failed += 1
-    
+
     return successful, failed
 
+def apply_scheduled_jobs(jobs, remove_priority, dag_sources=None, static=False, resources=None):
+    """
+    Apply a schedule held in memory by one of the Md-* schedulers.
+
+    jobs are the scheduler's Job objects; no schedule CSV is read or written.
+    """
+    workflow_jobs = defaultdict(dict)
+    for job in jobs:
+        workflow_jobs[job.workflow_folder][job.name] = {
+            'exec_num': str(job.execution_number),
+            'preference': getattr(job, 'preference', None),
+            'assigned_resource': job.assigned_resource
+        }
+    return apply_workflows(workflow_jobs, remove_priority, dag_sources, static, resources)
+
+def process_workflows(schedule_file, remove_priority, static=False, resource_file=None):
+    """Process all workflows from the schedule."""
+    # Read the schedule
+    workflow_jobs = read_schedule(schedule_file)
+    resources = read_resources(resource_file) if resource_file else None
+    return apply_workflows(workflow_jobs, remove_priority, static=static, resources=resources)
+
 def main():
     parser = argparse.ArgumentParser(
         description="Edit DAG files and submit files based on schedule to add PRE-POST scripts with execution numbers and preference"
     )
-    parser.add_argument(
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument(
         '-s', '--schedule',
-        required=True,
         help="Path to the schedule CSV file"
     )
+    group.add_argument(
+        '--restore',
+        nargs='+',
+        metavar='folder',
+        help="Restore workflow folder(s) from their pristine snapshot"
+    )
     parser.add_argument(
         '-rm-prio',
         action='store_true',
         help="Remove PRIORITY lines from both DAG and submit files"
     )
-    
+    parser.add_argument(
+        '-static',
+        action='store_true',
+        help="Write the assigned resource and ordering into each submit file and skip the PRE/POST scripts"
+    )
+    parser.add_argument(
+        '--throttle', '-throttle',
+        metavar='resource_file',
+        help="Add per-preference CATEGORY/MAXJOBS throttles sized to the slots in this resource file"
+    )
+
     args = parser.parse_args()
 
-    print(f"Processing schedule from: {args.schedule}")
-    print(f"Remove priority lines: {args.rm_prio}")
-    
-    successful, failed = process_workflows(args.schedule, args.rm_prio)
-    
+    if args.restore:
+        successful = sum(restore_workflow(folder) for folder in args.restore)
+        failed = len(args.restore) - successful
+    else:
+        print(f"Processing schedule from: {args.schedule}")
+        print(f"Remove priority lines: {args.rm_prio}")
+        print(f"Static allocation: {args.static}")
+        print(f"Throttle resources: {args.throttle}")
+
+        successful, failed = process_workflows(args.schedule, args.rm_prio, args.static, args.throttle)
+
     print("\nSummary:")
     print(f"Successfully processed: {successful} workflow(s)")
     print(f"Failed to process: {failed} workflow(s)")
-    
+
     if failed > 0:
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -21,6 +21,11 @@ python3 Md-HEFT.py --resources <resource_file> \
     -workflow <workflow_folder1> \
     -workflow <workflow_folder2> \
     --output <output_file>
+
+Add --apply (and optionally -rm-prio, -static or -throttle/--throttle) to write the schedule straight into the
+DAG and submit files; the CSV is then only written if --output is given.
+Pass --factors <file> to use a calibrated factor table (optimiser/ECT/calibrate.py) other than
+calibrated_factors.json next to this script.
 """
 
 import argparse
@@ -28,25 +33,16 @@ import os
 import csv
 import sys
 import glob
-from typing import Dict, List, Set
-from dataclasses import dataclass
+import importlib.util
+from typing import Dict, List, Set, Tuple
+from dataclasses import dataclass, field
 from collections import defaultdict
 from pathlib import Path
 
-# Job execution and communication costs
-JOB_INFO = {
-    'create_dir_montage': {'exec_time': 0, 'comm_before': 0, 'comm_after': 0},
-    'stage_in': {'exec_time': 0, 'comm_before': 0, 'comm_after': 0},
-    'stage_out': {'exec_time': 0, 'comm_before': 0, 'comm_after': 0},
-    'mProject': {'exec_time': 599.75, 'comm_before': 18, 'comm_after': 3},
-    'mDiffFit': {'exec_time': 46.23, 'comm_before': 46, 'comm_after': 2},
-    'mConcatFit': {'exec_time': 10.0, 'comm_before': 30, 'comm_after': 2},
-    'mBgModel': {'exec_time': 12.5, 'comm_before': 46, 'comm_after': 2},
-    'mBackground': {'exec_time': 38.0, 'comm_before': 13, 'comm_after': 2},
-    'mImgtbl': {'exec_time': 17.5, 'comm_before': 31, 'comm_after': 2},
-    'mAdd': {'exec_time': 25.0, 'comm_before': 173, 'comm_after': 7},
-    'mViewer': {'exec_time': 16.66, 'comm_before': 5, 'comm_after': 2}
-}
+from workflow_registry import WorkflowRegistry, DEFAULT_FACTOR_FILE
+
+# DAG editor used by --apply (loaded from file as its name is not importable)
+DAG_EDITOR_SCRIPT = '0pre-process-dag-editor-pre-post-remove-prio.py'
 
 @dataclass
 class Job:
@@ -54,6 +50,9 @@ class Job:
     type: str
     workflow_id: str
     workflow_folder: str
+    family: str = ""
+    # Execution and communication costs of the job type (from the workflow registry)
+    info: Dict[str, float] = field(default_factory=dict)
     upward_rank: float = 0.0
     execution_number: int = 0
     estimated_start: float = 0.0
@@ -61,12 +60,16 @@ class Job:
     assigned_resource: str = ""
 
 class HEFTScheduler:
-    def __init__(self):
+    def __init__(self, factor_file: str = DEFAULT_FACTOR_FILE):
         self.jobs: Dict[str, Job] = {}
         self.dependencies: Dict[str, List[str]] = defaultdict(list)
         self.reverse_dependencies: Dict[str, List[str]] = defaultdict(list)
         self.resources: List[str] = []
         self.execution_counter: int = 1
+        # DAG text of each workflow folder, handed to the DAG editor by --apply
+        self.dag_sources: Dict[str, Tuple[str, str]] = {}
+        # Workflow family and job types of each folder, cached across runs
+        self.registry = WorkflowRegistry(factor_file=factor_file)
 
     def read_resources(self, resource_file: str):
         """Read resource file containing slot definitions."""
@@ -100,6 +103,9 @@ class HEFTScheduler:
             
             with open(dag_file, 'r') as f:
                 content = f.read()
+            self.dag_sources[abs_workflow_path] = (dag_file, content)
+            record = self.registry.index(abs_workflow_path, dag_file, content)
+            family = record['family']
 
             for line in content.split('\n'):
                 if line.startswith('JOB'):
@@ -109,12 +115,14 @@ class HEFTScheduler:
                         continue
                     
                     job_name = parts[1]
-                    job_type = job_name.split('_')[0] if '_' in job_name else job_name
+                    job_type = self.registry.job_type(record, job_name)
                     full_job_name = f"{workflow_id}:{job_name}"
                     
                     self.jobs[full_job_name] = Job(
                         name=job_name,
                         type=job_type,
+                        family=family,
+                        info=self.registry.job_info(family, job_type),
                         workflow_id=workflow_id,
                         workflow_folder=abs_workflow_path
                     )
@@ -146,7 +154,7 @@ class HEFTScheduler:
             return memo[job_id]
             
         job = self.jobs[job_id]
-        job_info = JOB_INFO.get(job.type, {'exec_time': 0, 'comm_before': 0, 'comm_after': 0})
+        job_info = job.info
         
         if job_id not in self.dependencies:
             rank = job_info['exec_time']
@@ -154,7 +162,7 @@ class HEFTScheduler:
             max_child_rank = 0
             for child in self.dependencies[job_id]:
                 child_rank = self.calculate_upward_rank(child, memo)
-                child_comm_cost = JOB_INFO.get(self.jobs[child].type, {}).get('comm_before', 0)
+                child_comm_cost = self.jobs[child].info['comm_before']
                 max_child_rank = max(max_child_rank, child_rank + child_comm_cost)
             
             rank = job_info['exec_time'] + max_child_rank
@@ -194,10 +202,11 @@ class HEFTScheduler:
                             key=lambda job_id: self.jobs[job_id].upward_rank)
             
             job = self.jobs[best_job_id]
-            job_info = JOB_INFO.get(job.type, {'exec_time': 0, 'comm_before': 0, 'comm_after': 0})
+            job_info = job.info
             
             # Find earliest available resource
             earliest_time = float('inf')
+            earliest_finish = float('inf')
             best_resource = None
             
             for resource in self.resources:
@@ -208,17 +217,20 @@ class HEFTScheduler:
                     parent = self.jobs[parent_id]
                     parent_completion = parent.estimated_finish
                     if parent.assigned_resource != resource:
-                        parent_completion += JOB_INFO.get(parent.type, {}).get('comm_after', 0)
+                        parent_completion += parent.info['comm_after']
                     start_time = max(start_time, parent_completion)
                 
-                if start_time < earliest_time:
+                # Earliest finish; with calibrated node speeds a later start can still finish first
+                finish_time = start_time + job_info['exec_time'] / self.registry.node_speed(resource)
+                if finish_time < earliest_finish:
+                    earliest_finish = finish_time
                     earliest_time = start_time
                     best_resource = resource
             
             # Assign job to resource
             job.execution_number = self.execution_counter
             job.estimated_start = earliest_time
-            job.estimated_finish = earliest_time + job_info['exec_time']
+            job.estimated_finish = earliest_finish
             job.assigned_resource = best_resource
             
             resource_available_time[best_resource] = job.estimated_finish
@@ -273,12 +285,31 @@ class HEFTScheduler:
             print(f"Error writing schedule to file: {e}")
             sys.exit(1)
 
+def load_dag_editor():
+    """Load the DAG editor script as a module."""
+    editor_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), DAG_EDITOR_SCRIPT)
+    spec = importlib.util.spec_from_file_location('dag_editor', editor_path)
+    dag_editor = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(dag_editor)
+    return dag_editor
+
 def main():
     parser = argparse.ArgumentParser(description="Basic Multi-DAG HEFT Scheduler")
     parser.add_argument("--resources", required=True, help="Path to resources file")
-    parser.add_argument("--output", default="schedule.csv", help="Output schedule file (CSV)")
+    parser.add_argument("--output", default=None,
+                       help="Output schedule file (CSV). Defaults to schedule.csv, optional with --apply")
     parser.add_argument("-workflow", action='append', metavar='folder',
                        help="Workflow folder path")
+    parser.add_argument("--apply", action='store_true',
+                       help="Write the schedule straight into the DAG and submit files (no CSV round-trip)")
+    parser.add_argument("-rm-prio", action='store_true',
+                       help="With --apply, remove PRIORITY lines from both DAG and submit files")
+    parser.add_argument("-static", action='store_true',
+                       help="With --apply, pin jobs to their assigned resource in the submit files instead of PRE/POST scripts")
+    parser.add_argument("-throttle", "--throttle", action='store_true',
+                       help="With --apply, add per-preference CATEGORY/MAXJOBS throttles sized to the resource pools")
+    parser.add_argument("--factors", default=DEFAULT_FACTOR_FILE,
+                       help="Calibrated factor table from optimiser/ECT/calibrate.py (used if present)")
     
     args = parser.parse_args()
     
@@ -287,18 +318,34 @@ def main():
         parser.print_help()
         sys.exit(1)
     
-    scheduler = HEFTScheduler()
+    scheduler = HEFTScheduler(args.factors)
     scheduler.read_resources(args.resources)
     
     for i, workflow_folder in enumerate(args.workflow):
         workflow_id = f"workflow_{i+1}"
         scheduler.parse_workflow_folder(workflow_folder, workflow_id)
     
+    scheduler.registry.save()
     scheduler.schedule_jobs()
-    scheduler.write_schedule(args.output)
-    
-    print(f"Schedule has been written to {args.output}")
-    print(f"Summary has been written to {os.path.splitext(args.output)[0]}_summary.txt")
+
+    if args.output is None and not args.apply:
+        args.output = "schedule.csv"
+
+    if args.output:
+        scheduler.write_schedule(args.output)
+
+        print(f"Schedule has been written to {args.output}")
+        print(f"Summary has been written to {os.path.splitext(args.output)[0]}_summary.txt")
+
+    if args.apply:
+        dag_editor = load_dag_editor()
+        successful, failed = dag_editor.apply_scheduled_jobs(
+            scheduler.jobs.values(), args.rm_prio, scheduler.dag_sources, args.static,
+            scheduler.resources if args.throttle else None)
+
+        print(f"Schedule applied to {successful} workflow(s), {failed} failed")
+        if failed > 0:
+            sys.exit(1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -44,8 +44,17 @@ python3 scheduler.py --resources <resource_file> \
 Arguments:
 ---------
 --resources : Path to resource definition file
---output   : Path for output schedule file (CSV)
+--output   : Path for output schedule file (CSV), optional with --apply
 -workflow  : Workflow folder path and preference (can be specified multiple times)
+--apply    : Rewrite the DAG and submit files directly from the in-memory schedule
+             (same edits as 0pre-process-dag-editor-pre-post-remove-prio.py)
+-rm-prio   : With --apply, remove priority lines from DAG and submit files
+-static    : With --apply, write requirements = (Name == "<assigned_resource>") into the
+             submit files and skip the PRE/POST allocator scripts
+-throttle  : (or --throttle) With --apply, add DAGMan CATEGORY/MAXJOBS throttles per preference, sized to
+             the preference's slot pool in --resources
+--factors  : Calibrated factor table (default: calibrated_factors.json next to the scripts,
+             used only if present); sets exec_time per job type and node speeds
 
 Preferences:
 ----------
@@ -62,11 +71,13 @@ Input Requirements:
 2. Workflow Folders:
    - Must contain exactly one .dag file
    - DAG file should follow HTCondor DAGMan syntax
-   - Jobs in DAG should map to defined job types
+   - Jobs in DAG should map to job types known to the workflow registry
 
 Job Type Definitions:
 ------------------
-Predefined job types with execution and communication costs:
+Job types and their execution and communication costs come from workflow_registry.py,
+which detects the workflow family (montage, 1000-genome) of each folder and classifies
+its jobs with per-family rules. Montage job types:
 - create_dir_montage: Directory creation jobs
 - stage_in/stage_out: Data staging jobs
 - mProject: Image projection
@@ -77,10 +88,12 @@ Predefined job types with execution and communication costs:
 - mImgtbl: Image table creation
 - mAdd: Image addition
 - mViewer: Image visualization
+1000-genome job types: individuals, individuals_merge, sifting, mutation_overlap, frequency
+(their costs are not measured yet and must come from a calibrated factor table, see --factors)
 
 Output:
 ------
-1. CSV Schedule File:
+1. CSV Schedule File (skipped with --apply unless --output is given):
    - execution_number: Order of execution (1 to N)
    - workflow_id: Identifier for the workflow
    - workflow_folder_path: Absolute path to workflow folder
@@ -129,25 +142,16 @@ import os
 import csv
 import sys
 import glob
+import importlib.util
 from typing import Dict, List, Tuple, Set
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from collections import defaultdict
 from pathlib import Path
 
-# Job execution and communication costs remain the same
-JOB_INFO = {
-    'create_dir_montage': {'exec_time': 0, 'comm_before': 0, 'comm_after': 0},
-    'stage_in': {'exec_time': 0, 'comm_before': 0, 'comm_after': 0},
-    'stage_out': {'exec_time': 0, 'comm_before': 0, 'comm_after': 0},
-    'mProject': {'exec_time': 599.75, 'comm_before': 18, 'comm_after': 3},
-    'mDiffFit': {'exec_time': 46.23, 'comm_before': 46, 'comm_after': 2},
-    'mConcatFit': {'exec_time': 10.0, 'comm_before': 30, 'comm_after': 2},
-    'mBgModel': {'exec_time': 12.5, 'comm_before': 46, 'comm_after': 2},
-    'mBackground': {'exec_time': 38.0, 'comm_before': 13, 'comm_after': 2},
-    'mImgtbl': {'exec_time': 17.5, 'comm_before': 31, 'comm_after': 2},
-    'mAdd': {'exec_time': 25.0, 'comm_before': 173, 'comm_after': 7},
-    'mViewer': {'exec_time': 16.66, 'comm_before': 5, 'comm_after': 2}
-}
+from workflow_registry import WorkflowRegistry, DEFAULT_FACTOR_FILE
+
+# DAG editor used by --apply (loaded from file as its name is not importable)
+DAG_EDITOR_SCRIPT = '0pre-process-dag-editor-pre-post-remove-prio.py'
 
 @dataclass
 class Job:
@@ -156,6 +160,9 @@ class Job:
     workflow_id: str
     preference: str
     workflow_folder: str
+    family: str = ""
+    # Execution and communication costs of the job type (from the workflow registry)
+    info: Dict[str, float] = field(default_factory=dict)
     priority: int = 0
     upward_rank: float = 0.0
     execution_number: int = 0
@@ -164,12 +171,16 @@ class Job:
     assigned_resource: str = ""
 
 class DAGScheduler:
-    def __init__(self):
+    def __init__(self, factor_file: str = DEFAULT_FACTOR_FILE):
         self.jobs: Dict[str, Job] = {}
         self.dependencies: Dict[str, List[str]] = defaultdict(list)
         self.reverse_dependencies: Dict[str, List[str]] = defaultdict(list)
         self.resources: List[str] = []
         self.execution_counter: int = 1
+        # DAG text of each workflow folder, handed to the DAG editor by --apply
+        self.dag_sources: Dict[str, Tuple[str, str]] = {}
+        # Workflow family and job types of each folder, cached across runs
+        self.registry = WorkflowRegistry(factor_file=factor_file)
         
         # Store all resources to enable preference-based resource filtering
         self.all_resources: List[str] = []
@@ -209,6 +220,9 @@ class DAGScheduler:
             
             with open(dag_file, 'r') as f:
                 content = f.read()
+            self.dag_sources[abs_workflow_path] = (dag_file, content)
+            record = self.registry.index(abs_workflow_path, dag_file, content)
+            family = record['family']
 
             for line in content.split('\n'):
                 if line.startswith('JOB'):
@@ -218,12 +232,14 @@ class DAGScheduler:
                         continue
                     
                     job_name = parts[1]
-                    job_type = job_name.split('_')[0] if '_' in job_name else job_name
+                    job_type = self.registry.job_type(record, job_name)
                     full_job_name = f"{workflow_id}:{job_name}"
                     
                     self.jobs[full_job_name] = Job(
                         name=job_name,
                         type=job_type,
+                        family=family,
+                        info=self.registry.job_info(family, job_type),
                         workflow_id=workflow_id,
                         preference=preference,
                         workflow_folder=abs_workflow_path
@@ -259,7 +275,7 @@ class DAGScheduler:
             return memo[job_id]
             
         job = self.jobs[job_id]
-        job_info = JOB_INFO.get(job.type, {'exec_time': 0, 'comm_before': 0, 'comm_after': 0})
+        job_info = job.info
         
         if job_id not in self.dependencies:
             rank = job_info['exec_time']
@@ -267,7 +283,7 @@ class DAGScheduler:
             max_child_rank = 0
             for child in self.dependencies[job_id]:
                 child_rank = self.calculate_upward_rank(child, memo)
-                child_comm_cost = JOB_INFO.get(self.jobs[child].type, {}).get('comm_before', 0)
+                child_comm_cost = self.jobs[child].info['comm_before']
                 max_child_rank = max(max_child_rank, child_rank + child_comm_cost)
             
             rank = job_info['exec_time'] + max_child_rank
@@ -359,11 +375,12 @@ class DAGScheduler:
                 break
                 
             job = self.jobs[best_job_id]
-            job_info = JOB_INFO.get(job.type, {'exec_time': 0, 'comm_before': 0, 'comm_after': 0})
+            job_info = job.info
             
             # Get the appropriate resources based on job's preference
             available_resources = self.get_resources_for_preference(job.preference)
             earliest_time = float('inf')
+            earliest_finish = float('inf')
             best_resource = None
             
             for resource in available_resources:
@@ -373,16 +390,19 @@ class DAGScheduler:
                     parent = self.jobs[parent_id]
                     parent_completion = parent.estimated_finish
                     if parent.assigned_resource != resource:
-                        parent_completion += JOB_INFO.get(parent.type, {}).get('comm_after', 0)
+                        parent_completion += parent.info['comm_after']
                     start_time = max(start_time, parent_completion)
                 
-                if start_time < earliest_time:
+                # Earliest finish; with calibrated node speeds a later start can still finish first
+                finish_time = start_time + job_info['exec_time'] / self.registry.node_speed(resource)
+                if finish_time < earliest_finish:
+                    earliest_finish = finish_time
                     earliest_time = start_time
                     best_resource = resource
             
             job.execution_number = self.execution_counter
             job.estimated_start = earliest_time
-            job.estimated_finish = earliest_time + job_info['exec_time']
+            job.estimated_finish = earliest_finish
             job.assigned_resource = best_resource
             print(self.execution_counter)
             resource_available_time[best_resource] = job.estimated_finish
@@ -453,12 +473,31 @@ class DAGScheduler:
             print(f"Error writing schedule to file: {e}")
             sys.exit(1)
 
+def load_dag_editor():
+    """Load the DAG editor script as a module."""
+    editor_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), DAG_EDITOR_SCRIPT)
+    spec = importlib.util.spec_from_file_location('dag_editor', editor_path)
+    dag_editor = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(dag_editor)
+    return dag_editor
+
 def main():
     parser = argparse.ArgumentParser(description="Multi-DAG HEFT Scheduler with Preferences")
     parser.add_argument("--resources", required=True, help="Path to resources file")
-    parser.add_argument("--output", default="schedule.csv", help="Output schedule file (CSV)")
+    parser.add_argument("--output", default=None,
+                       help="Output schedule file (CSV). Defaults to schedule.csv, optional with --apply")
     parser.add_argument("-workflow", action='append', nargs=2, metavar=('folder', 'preference'),
                        help="Workflow folder path and preference (performance/balanced/energy)")
+    parser.add_argument("--apply", action='store_true',
+                       help="Write the schedule straight into the DAG and submit files (no CSV round-trip)")
+    parser.add_argument("-rm-prio", action='store_true',
+                       help="With --apply, remove PRIORITY lines from both DAG and submit files")
+    parser.add_argument("-static", action='store_true',
+                       help="With --apply, pin jobs to their assigned resource in the submit files instead of PRE/POST scripts")
+    parser.add_argument("-throttle", "--throttle", action='store_true',
+                       help="With --apply, add per-preference CATEGORY/MAXJOBS throttles sized to the resource pools")
+    parser.add_argument("--factors", default=DEFAULT_FACTOR_FILE,
+                       help="Calibrated factor table from optimiser/ECT/calibrate.py (used if present)")
     
     args = parser.parse_args()
     
@@ -467,7 +506,7 @@ def main():
         parser.print_help()
         sys.exit(1)
     
-    scheduler = DAGScheduler()
+    scheduler = DAGScheduler(args.factors)
     scheduler.read_resources(args.resources)
     
     for i, (workflow_folder, preference) in enumerate(args.workflow):
@@ -478,11 +517,27 @@ def main():
         workflow_id = f"workflow_{i+1}"
         scheduler.parse_workflow_folder(workflow_folder, preference, workflow_id)
     
+    scheduler.registry.save()
     scheduler.schedule_jobs()
-    scheduler.write_schedule(args.output)
-    
-    print(f"Schedule has been written to {args.output}")
-    print(f"Summary has been written to {os.path.splitext(args.output)[0]}_summary.txt")
+
+    if args.output is None and not args.apply:
+        args.output = "schedule.csv"
+
+    if args.output:
+        scheduler.write_schedule(args.output)
+
+        print(f"Schedule has been written to {args.output}")
+        print(f"Summary has been written to {os.path.splitext(args.output)[0]}_summary.txt")
+
+    if args.apply:
+        dag_editor = load_dag_editor()
+        successful, failed = dag_editor.apply_scheduled_jobs(
+            scheduler.jobs.values(), args.rm_prio, scheduler.dag_sources, args.static,
+            scheduler.all_resources if args.throttle else None)
+
+        print(f"Schedule applied to {successful} workflow(s), {failed} failed")
+        if failed > 0:
+            sys.exit(1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,78 @@
+"""
+Tests for the pristine snapshots of the DAG editor
+
+Run with: python3 -m pytest test_dag_editor.py
+"""
+import importlib.util
+import os
+
+EDITOR_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           '0pre-process-dag-editor-pre-post-remove-prio.py')
+spec = importlib.util.spec_from_file_location('dag_editor', EDITOR_FILE)
+dag_editor = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(dag_editor)
+
+EMWOS_SCRIPT = '/usr/local/bin/emwos-pre-post'
+HEADER = ['#' * 70 + '\n', '# PEGASUS WMS GENERATED DAG FILE\n', '# DAG montage\n'] + ['#\n'] * 7
+JOBS = {'mProject_ID0000001': {'exec_num': '1', 'preference': 'energy', 'assigned_resource': 'slot1@alpha'},
+        'mAdd_ID0000002': {'exec_num': '2', 'preference': 'energy', 'assigned_resource': 'slot2@alpha'}}
+
+def write(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+
+def read(path):
+    with open(path, 'r') as f:
+        return f.read()
+
+def make_workflow(folder, arguments='-x'):
+    """Pegasus-like workflow folder: a DAG and one submit file per job"""
+    lines = list(HEADER)
+    for job in JOBS:
+        lines.append(f"JOB {job} {job}.sub\n")
+        lines.append(f"SCRIPT POST {job} /usr/bin/pegasus-exitcode {job}.out\n")
+        lines.append(f"PRIORITY {job} 10\n")
+        write(os.path.join(folder, f"{job}.sub"),
+              f"executable = /bin/true\narguments = {arguments}\npriority = 10\nqueue\n")
+    dag_file = os.path.join(folder, 'montage-0.dag')
+    write(dag_file, ''.join(lines))
+    return dag_file
+
+def apply(folder, static=False):
+    options = {'remove_priority': True, 'static': static, 'maxjobs': None}
+    job_info = JOBS if static else {job: {'exec_num': data['exec_num'], 'preference': data['preference']}
+                                    for job, data in JOBS.items()}
+    return dag_editor.apply_workflow(str(folder), job_info, options, None if static else EMWOS_SCRIPT)
+
+def test_regenerated_workflow_keeps_new_submit_files(tmp_path):
+    make_workflow(tmp_path)
+    assert apply(tmp_path)
+    submit_file = tmp_path / 'mAdd_ID0000002.sub'
+    assert 'priority' not in read(submit_file)
+
+    # Planning the workflow again writes a fresh DAG and changed submit files
+    dag_file = make_workflow(tmp_path, arguments='-y')
+    write(dag_file, read(dag_file) + '# replanned\n')
+    assert apply(tmp_path)
+
+    assert read(submit_file) == "executable = /bin/true\narguments = -y\nqueue\n"
+    assert '-y' in read(dag_editor.get_pristine_path(str(tmp_path), str(submit_file)))
+    assert '# replanned' in read(dag_file)
+    assert 'SCRIPT PRE mAdd_ID0000002' in read(dag_file)
+
+def test_static_edit_is_not_taken_for_an_original(tmp_path):
+    dag_file = make_workflow(tmp_path)
+    original = read(dag_file)
+    assert apply(tmp_path, static=True)
+    assert dag_editor.is_edited_dag(read(dag_file).splitlines(keepends=True))
+
+    # A hand edit is rebuilt from the original, not snapshotted as a new one
+    write(dag_file, read(dag_file) + '# hand edit\n')
+    assert apply(tmp_path, static=True)
+    assert read(dag_editor.get_pristine_path(str(tmp_path), dag_file)) == original
+    assert '# hand edit' not in read(dag_file)
+
+    # Without a manifest or snapshot the edited DAG is refused
+    os.remove(tmp_path / dag_editor.MANIFEST_FILE)
+    os.remove(dag_editor.get_pristine_path(str(tmp_path), dag_file))
+    assert not apply(tmp_path, static=True)
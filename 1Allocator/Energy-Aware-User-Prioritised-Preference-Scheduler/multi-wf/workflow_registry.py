@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Workflow Metadata Registry for EMWOS Workflow Scheduling
+
+This module indexes workflow folders once and caches what the schedulers need to know
+about them, so job types and costs no longer have to be guessed from job names.
+
+For every workflow folder the registry records:
+- family: workflow family (montage, 1000-genome, ...) from the DAG header, or info.txt
+- size: input size description from info.txt (e.g. "50k i10" for "genome 50k i10")
+- dag_hash: sha256 of the DAG file
+- job_types: job name -> job type, using the family's regular expressions
+
+Job Type Rules:
+-------------
+Each family has an ordered list of (regex, type) rules. The first matching rule wins and
+the type may reference regex groups (e.g. montage "mDiffFit_ID0000012" -> "mDiffFit").
+Jobs that match no rule fall back to the name without its "_IDnnnnnnn" suffix.
+
+Job names from allocator logs come without a DAG. detect_family() recognises a family by
+the names only it uses (its compute stages, or create_dir/cleanup jobs carrying the DAG
+label); stage_in/stage_out jobs belong to no particular family and classify the same way
+for all of them.
+
+Job Costs:
+---------
+JOB_INFO holds execution and communication costs per family and job type. Montage values
+are the ones the Md-* schedulers always used. The 1000-genome compute stages have not
+been measured yet; their values are initial estimates (relative stage weights), listed in
+ESTIMATED_COSTS, and job_info() warns once per type when it uses one of them. A calibrated
+factor table built from real runs replaces them.
+
+Calibrated Factors:
+-----------------
+If calibrated_factors.json (written by optimiser/ECT/calibrate.py) exists next to this
+script, or another factor file is given, its fitted per-type work replaces the exec_time
+of those job types and its per-node speed is available through node_speed().
+
+Cache:
+-----
+Records are stored in workflow_registry.json next to this script, keyed by absolute folder.
+A record is reused as long as the size and mtime of the DAG file and info.txt are unchanged.
+
+Usage:
+-----
+From a scheduler:
+    registry = WorkflowRegistry()
+    record = registry.index(workflow_folder)
+    job_type = registry.job_type(record, job_name)
+    cost = registry.job_info(record['family'], job_type)
+    registry.save()
+
+From the command line (prints a summary of each folder):
+    python3 workflow_registry.py run1 run2 run3
+
+Authors:
+-------
+Created for EMWOS Workflow Scheduling System by Mehul Warade
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Optional
+
+DEFAULT_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'workflow_registry.json')
+CACHE_VERSION = 1
+DEFAULT_FACTOR_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'calibrated_factors.json')
+INFO_FILE = 'info.txt'
+
+# Cost used for job types that have no entry in JOB_INFO
+DEFAULT_JOB_INFO = {'exec_time': 0, 'comm_before': 0, 'comm_after': 0}
+
+# Job execution and communication costs per workflow family
+JOB_INFO = {
+    'montage': {
+        'create_dir_montage': {'exec_time': 0, 'comm_before': 0, 'comm_after': 0},
+        'stage_in': {'exec_time': 0, 'comm_before': 0, 'comm_after': 0},
+        'stage_out': {'exec_time': 0, 'comm_before': 0, 'comm_after': 0},
+        'cleanup': {'exec_time': 0, 'comm_before': 0, 'comm_after': 0},
+        'mProject': {'exec_time': 599.75, 'comm_before': 18, 'comm_after': 3},
+        'mDiffFit': {'exec_time': 46.23, 'comm_before': 46, 'comm_after': 2},
+        'mConcatFit': {'exec_time': 10.0, 'comm_before': 30, 'comm_after': 2},
+        'mBgModel': {'exec_time': 12.5, 'comm_before': 46, 'comm_after': 2},
+        'mBackground': {'exec_time': 38.0, 'comm_before': 13, 'comm_after': 2},
+        'mImgtbl': {'exec_time': 17.5, 'comm_before': 31, 'comm_after': 2},
+        'mAdd': {'exec_time': 25.0, 'comm_before': 173, 'comm_after': 7},
+        'mViewer': {'exec_time': 16.66, 'comm_before': 5, 'comm_after': 2}
+    },
+    '1000-genome': {
+        'create_dir': {'exec_time': 0, 'comm_before': 0, 'comm_after': 0},
+        'stage_in': {'exec_time': 0, 'comm_before': 0, 'comm_after': 0},
+        'stage_out': {'exec_time': 0, 'comm_before': 0, 'comm_after': 0},
+        'cleanup': {'exec_time': 0, 'comm_before': 0, 'comm_after': 0},
+        'individuals': {'exec_time': 120.0, 'comm_before': 20, 'comm_after': 5},
+        'individuals_merge': {'exec_time': 60.0, 'comm_before': 10, 'comm_after': 5},
+        'sifting': {'exec_time': 10.0, 'comm_before': 10, 'comm_after': 2},
+        'mutation_overlap': {'exec_time': 40.0, 'comm_before': 5, 'comm_after': 2},
+        'frequency': {'exec_time': 80.0, 'comm_before': 5, 'comm_after': 2}
+    }
+}
+
+# Job types whose JOB_INFO cost is an estimate, not a measurement; calibrate them
+ESTIMATED_COSTS = {
+    '1000-genome': {'individuals', 'individuals_merge', 'sifting', 'mutation_overlap', 'frequency'}
+}
+
+# (regex, job type) rules of the Pegasus data jobs every family shares
+COMMON_RULES = [
+    (r'^stage_in_', 'stage_in'),
+    (r'^stage_out_', 'stage_out')
+]
+
+# Ordered (regex, job type) rules per workflow family; the first match wins
+JOB_TYPE_RULES = {
+    'montage': [
+        (r'^create_dir_', 'create_dir_montage'),
+        *COMMON_RULES,
+        (r'^cleanup_', 'cleanup'),
+        (r'^(m[A-Za-z]+)_ID\d+$', r'\1')
+    ],
+    '1000-genome': [
+        (r'^create_dir_', 'create_dir'),
+        *COMMON_RULES,
+        (r'^cleanup_', 'cleanup'),
+        (r'^(individuals_merge|individuals|sifting|mutation_overlap|frequency)_ID\d+$', r'\1')
+    ]
+}
+
+# Job names that only occur in one family: its compute stages and its labelled create_dir/cleanup
+FAMILY_SIGNATURES = {
+    'montage': r'^(m[A-Z][A-Za-z]+_ID\d+$|(create_dir|cleanup)_montage_)',
+    '1000-genome': r'^((individuals_merge|individuals|sifting|mutation_overlap|frequency)_ID\d+$'
+                   r'|(create_dir|cleanup)_1000-genome_)'
+}
+
+# Names used for a family in info.txt or the DAG header
+FAMILY_ALIASES = {
+    'montage': 'montage',
+    'genome': '1000-genome',
+    '1000genome': '1000-genome',
+    '1000-genome': '1000-genome'
+}
+
+COMPILED_RULES = {family: [(re.compile(pattern), job_type) for pattern, job_type in rules]
+                  for family, rules in JOB_TYPE_RULES.items()}
+COMPILED_COMMON_RULES = [(re.compile(pattern), job_type) for pattern, job_type in COMMON_RULES]
+COMPILED_SIGNATURES = {family: re.compile(pattern) for family, pattern in FAMILY_SIGNATURES.items()}
+ID_SUFFIX = re.compile(r'_ID\d+$')
+DAG_NAME = re.compile(r'^# DAG (\S+)', re.MULTILINE)
+
+
+def detect_family(job_name: str) -> Optional[str]:
+    """Family of a job name that only one family uses, None for shared names (stage_in, ...)."""
+    for family, signature in COMPILED_SIGNATURES.items():
+        if signature.match(job_name):
+            return family
+    return None
+
+
+def classify_job(family: Optional[str], job_name: str) -> str:
+    """
+    Return the job type of a job name for a workflow family.
+
+    family None means the family is unknown (detect_family found nothing): only the rules
+    shared by every family are applied, never another family's rules.
+    """
+    rules = COMPILED_RULES.get(family, COMPILED_COMMON_RULES)
+    for pattern, job_type in rules:
+        match = pattern.match(job_name)
+        if match:
+            return match.expand(job_type)
+    return ID_SUFFIX.sub('', job_name)
+
+
+def canonical_family(name: str) -> str:
+    """Map a family name from info.txt or a DAG header to its registry name."""
+    return FAMILY_ALIASES.get(name.lower(), name.lower())
+
+
+def file_signature(path: str) -> Optional[List[int]]:
+    """Size and mtime of a file, used to decide whether a cached record is stale."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class WorkflowRegistry:
+    def __init__(self, cache_file: str = DEFAULT_CACHE_FILE, factor_file: str = DEFAULT_FACTOR_FILE):
+        self.cache_file = cache_file
+        self.records: Dict[str, Dict] = {}
+        self.dirty = False
+        # Calibrated seconds per job type and speed per node (empty without a factor file)
+        self.type_work: Dict[str, float] = {}
+        self.node_speeds: Dict[str, float] = {}
+        # (family, job type) pairs whose estimated cost has been reported
+        self.warned = set()
+        self._load()
+        self._load_factors(factor_file)
+
+    def _load(self):
+        """Load cached records; a missing or unreadable cache just starts empty."""
+        try:
+            with open(self.cache_file, 'r') as f:
+                cache = json.load(f)
+        except FileNotFoundError:
+            return
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Warning: Ignoring unreadable registry cache {self.cache_file}: {e}")
+            return
+        if cache.get('version') == CACHE_VERSION:
+            self.records = cache.get('workflows', {})
+
+    def _load_factors(self, factor_file: str):
+        """Load a calibrated factor table; only a missing non-default file is reported."""
+        try:
+            with open(factor_file, 'r') as f:
+                table = json.load(f)
+        except FileNotFoundError:
+            if factor_file != DEFAULT_FACTOR_FILE:
+                print(f"Warning: Factor file {factor_file} not found, using JOB_INFO costs")
+            return
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Warning: Ignoring unreadable factor file {factor_file}: {e}")
+            return
+        self.type_work = table.get('type_work', {})
+        self.node_speeds = table.get('node_speed', {})
+
+    def save(self):
+        """Write the cache if any record was added or refreshed."""
+        if not self.dirty:
+            return
+        tmp_file = f"{self.cache_file}.tmp"
+        try:
+            with open(tmp_file, 'w') as f:
+                json.dump({'version': CACHE_VERSION, 'workflows': self.records}, f)
+            os.replace(tmp_file, self.cache_file)
+            self.dirty = False
+        except IOError as e:
+            print(f"Warning: Could not write registry cache {self.cache_file}: {e}")
+
+    def find_dag_file(self, workflow_folder: str) -> str:
+        """Find the .dag file in the workflow folder."""
+        dag_files = glob.glob(os.path.join(workflow_folder, "*.dag"))
+        if not dag_files:
+            raise FileNotFoundError(f"No .dag file found in {workflow_folder}")
+        return dag_files[0]
+
+    def index(self, workflow_folder: str, dag_file: Optional[str] = None,
+              dag_text: Optional[str] = None) -> Dict:
+        """
+        Return the record of a workflow folder, indexing it if it is new or has changed.
+
+        dag_file/dag_text can be passed by a caller that has already read the DAG.
+        """
+        workflow_folder = os.path.abspath(workflow_folder)
+        if dag_file is None:
+            dag_file = self.find_dag_file(workflow_folder)
+        info_file = os.path.join(workflow_folder, INFO_FILE)
+
+        signature = {'dag': file_signature(dag_file), 'info': file_signature(info_file)}
+        record = self.records.get(workflow_folder)
+        if record and record['dag_file'] == dag_file and record['signature'] == signature:
+            return record
+
+        if dag_text is None:
+            with open(dag_file, 'r') as f:
+                dag_text = f.read()
+
+        description = ''
+        if os.path.exists(info_file):
+            with open(info_file, 'r') as f:
+                description = f.read().strip()
+        info_parts = description.split()
+
+        # The DAG header ("# DAG montage") is authoritative; info.txt is the fallback
+        header = DAG_NAME.search(dag_text[:2000])
+        if header:
+            family = canonical_family(header.group(1))
+        elif info_parts:
+            family = canonical_family(info_parts[0])
+        else:
+            family = canonical_family(re.sub(r'-\d+$', '', os.path.splitext(os.path.basename(dag_file))[0]))
+
+        job_types = {}
+        for line in dag_text.split('\n'):
+            if line.startswith('JOB '):
+                parts = line.split()
+                if len(parts) >= 2:
+                    job_types[parts[1]] = classify_job(family, parts[1])
+
+        if family not in JOB_INFO:
+            print(f"Warning: No job costs known for workflow family '{family}' ({workflow_folder})")
+
+        record = {
+            'dag_file': dag_file,
+            'signature': signature,
+            'dag_hash': hashlib.sha256(dag_text.encode()).hexdigest(),
+            'family': family,
+            'size': ' '.join(info_parts[1:]),
+            'description': description,
+            'job_types': job_types
+        }
+        self.records[workflow_folder] = record
+        self.dirty = True
+        return record
+
+    def job_type(self, record: Dict, job_name: str) -> str:
+        """Job type of a job in an indexed workflow."""
+        job_type = record['job_types'].get(job_name)
+        if job_type is None:
+            job_type = classify_job(record['family'], job_name)
+        return job_type
+
+    def job_info(self, family: str, job_type: str) -> Dict[str, float]:
+        """
+        Execution and communication costs of a job type, with the calibrated exec_time if known.
+
+        A job type in ESTIMATED_COSTS that the factor table does not cover keeps its
+        estimated cost; the first lookup of each such type prints a warning.
+        """
+        info = JOB_INFO.get(family, {}).get(job_type, DEFAULT_JOB_INFO)
+        if job_type in self.type_work:
+            info = dict(info, exec_time=self.type_work[job_type])
+        elif job_type in ESTIMATED_COSTS.get(family, ()) and (family, job_type) not in self.warned:
+            self.warned.add((family, job_type))
+            print(f"Warning: Using the estimated cost of {family} job type '{job_type}'; calibrate it "
+                  f"from real runs with optimiser/ECT/calibrate.py and pass the table with --factors")
+        return info
+
+    def node_speed(self, resource: str) -> float:
+        """Calibrated speed of the node of a resource ("slot1@alpha" -> alpha), 1.0 if unknown."""
+        return self.node_speeds.get(resource.split('@', 1)[-1], 1.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index workflow folders and print their metadata")
+    parser.add_argument("folders", nargs='+', help="Workflow folder(s)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_FILE, help="Registry cache file")
+
+    args = parser.parse_args()
+
+    registry = WorkflowRegistry(args.cache)
+    for folder in args.folders:
+        try:
+            record = registry.index(folder)
+        except (FileNotFoundError, IOError) as e:
+            print(f"Error indexing {folder}: {e}")
+            continue
+
+        counts = Counter(record['job_types'].values())
+        unknown = [job_type for job_type in counts
+                   if job_type not in JOB_INFO.get(record['family'], {}) and job_type not in registry.type_work]
+        print(f"\n{os.path.abspath(folder)}")
+        print(f"  Family: {record['family']}  Size: {record['size'] or '-'}  Jobs: {len(record['job_types'])}")
+        print(f"  DAG hash: {record['dag_hash']}")
+        for job_type, count in sorted(counts.items()):
+            print(f"  {job_type}: {count}")
+        if unknown:
+            print(f"  Job types without costs: {', '.join(sorted(unknown))}")
+
+    registry.save()
+
+if __name__ == "__main__":
+    main()
@@ -1,76 +1,148 @@
+import argparse
+import gzip
+import os
 import re
 import json
 import csv
-from datetime import datetime
-import pytz
+import tarfile
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, Optional, Tuple
 
-def parse_log_file(input_file_path, output_file_path):
-    timestamp_pattern = r'\[(.*?)\]'
-    state_pattern = r'Overall State: ({.*?})'
-    
-    metrics_data = []
-    current_timestamp = None
-    
-    with open(input_file_path, 'r') as file:
-        lines = file.readlines()
-        for i in range(len(lines)):
-            print(f"Parsing line: '{i}'")
-            current_line = lines[i]
-            
-            # Store timestamp when we find it
-            timestamp_match = re.search(timestamp_pattern, current_line)
-            if timestamp_match:
-                timestamp_str = timestamp_match.group(1)
+# "[3/24/2025, 10:42:02 AM] [1742812922] ..."; older logs may lack the unix timestamp
+TIMESTAMP_PATTERN = re.compile(r'\[([^\]]*)\](?: \[(\d+)\])?')
+STATE_PATTERN = re.compile(r'Overall State: (\{.*?\})')
+STATE_MARKER = 'Overall State:'
+
+FIELDNAMES = ['timestamp', 'totalResources', 'freeResources',
+              'busyResources', 'jobsInQueue', 'pendingJobs']
+
+LOG_SUFFIX = '.log'
+
+def iter_logs(path: str) -> Iterator[Tuple[str, Iterable[str]]]:
+    """
+    (name, lines) of every log in a file, without extracting anything to disk
+
+    A .tar.gz/.tgz/.tar archive is read as a stream (tarfile mode 'r|*'), one member at
+    a time, and yields each *.log member; a .gz file is decompressed on the fly; any
+    other file is read as plain text. Each member's lines must be consumed before the
+    next member is requested.
+    """
+    if path.endswith(('.tar.gz', '.tgz', '.tar')):
+        with tarfile.open(path, 'r|*') as archive:
+            for member in archive:
+                if member.isfile() and member.name.endswith(LOG_SUFFIX):
+                    # Streamed members are not seekable, which TextIOWrapper needs; decode per line
+                    stream = archive.extractfile(member)
+                    yield member.name, (line.decode(errors='replace') for line in stream)
+    elif path.endswith('.gz'):
+        with gzip.open(path, 'rt', errors='replace') as file:
+            yield path[:-len('.gz')], file
+    else:
+        with open(path, 'r', errors='replace') as file:
+            yield path, file
+
+def iter_log_lines(path: str) -> Iterator[str]:
+    """Lines of all logs in a plain, gzip or tar file, one log after the other"""
+    for _, lines in iter_logs(path):
+        yield from lines
+
+def parse_timestamp(line: str) -> Optional[int]:
+    """Unix timestamp of a log line: the embedded [unix_ts], else the human-readable date (UTC)"""
+    match = TIMESTAMP_PATTERN.match(line)
+    if not match:
+        return None
+    if match.group(2):
+        return int(match.group(2))
+    try:
+        dt = datetime.strptime(match.group(1), '%m/%d/%Y, %I:%M:%S %p')
+    except ValueError:
+        return None
+    return int(dt.replace(tzinfo=timezone.utc).timestamp())
+
+def iter_metrics(lines: Iterable[str], errors: Optional[list] = None) -> Iterator[Dict]:
+    """
+    Stream the "Overall State" records of an allocator log
+
+    A state line belongs to the timestamp of the line right before it. Only state lines
+    are matched against the patterns; every other line costs one substring test.
+
+    :param lines: Log lines (a file object is read lazily)
+    :param errors: If given, a message for every state that could not be read is appended
+    """
+    previous = ''
+    for line in lines:
+        if STATE_MARKER in line:
+            timestamp = parse_timestamp(previous)
+            state_match = STATE_PATTERN.search(line)
+            if timestamp and state_match:
                 try:
-                    # Updated datetime format to match your log format
-                    dt = datetime.strptime(timestamp_str, '%m/%d/%Y, %H:%M:%S %p')
-                    if not dt.tzinfo:
-                        dt = pytz.timezone('UTC').localize(dt)
-                    current_timestamp = int(dt.timestamp())
-                except ValueError as e:
-                    # print(f"Error parsing timestamp '{timestamp_str}': {e}")
-                    continue
-            
-            # Look for metrics on the next line if we have a timestamp
-            if current_timestamp and i + 1 < len(lines):
-                next_line = lines[i + 1]
-                if 'Overall State:' in next_line:
-                    state_match = re.search(state_pattern, next_line)
-                    if state_match:
-                        try:
-                            metrics = json.loads(state_match.group(1))
-                            metrics_data.append({
-                                'timestamp': current_timestamp,
-                                'totalResources': metrics['totalResources'],
-                                'freeResources': metrics['freeResources'],
-                                'busyResources': metrics['busyResources'],
-                                'jobsInQueue': metrics['jobsInQueue'],
-                                'pendingJobs': metrics['pendingJobs']
-                            })
-                        except json.JSONDecodeError:
-                            print(f"Error parsing JSON at timestamp {timestamp_str}")
-                        except KeyError as e:
-                            print(f"Missing key in metrics at timestamp {timestamp_str}: {e}")
-                    current_timestamp = None  # Reset timestamp after using it
-    
-    # Write to CSV
-    if metrics_data:
-        fieldnames = ['timestamp', 'totalResources', 'freeResources', 
-                     'busyResources', 'jobsInQueue', 'pendingJobs']
-        
-        with open(output_file_path, 'w', newline='') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(metrics_data)
-        
-        print(f"Successfully wrote {len(metrics_data)} records to {output_file_path}")
-        print(f"First timestamp parsed: {metrics_data[0]['timestamp']}")
-        print(f"Last timestamp parsed: {metrics_data[-1]['timestamp']}")
+                    metrics = json.loads(state_match.group(1))
+                    yield {
+                        'timestamp': timestamp,
+                        'totalResources': metrics['totalResources'],
+                        'freeResources': metrics['freeResources'],
+                        'busyResources': metrics['busyResources'],
+                        'jobsInQueue': metrics['jobsInQueue'],
+                        'pendingJobs': metrics['pendingJobs']
+                    }
+                except json.JSONDecodeError:
+                    if errors is not None:
+                        errors.append(f"Error parsing JSON at timestamp {timestamp}")
+                except KeyError as e:
+                    if errors is not None:
+                        errors.append(f"Missing key in metrics at timestamp {timestamp}: {e}")
+        previous = line
+
+def parse_log_file(input_file_path, output_file_path):
+    errors = []
+    count = 0
+    first = last = None
+
+    with open(output_file_path, 'w', newline='') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        # Archives are streamed member by member; a state never spans two logs
+        for _, lines in iter_logs(input_file_path):
+            for record in iter_metrics(lines, errors):
+                writer.writerow(record)
+                if first is None:
+                    first = record['timestamp']
+                last = record['timestamp']
+                count += 1
+
+    for message in errors:
+        print(message)
+    if count:
+        print(f"Successfully wrote {count} records to {output_file_path}")
+        print(f"First timestamp parsed: {first}")
+        print(f"Last timestamp parsed: {last}")
     else:
         print("No metrics data found in the log file")
 
-# Example usage
+def output_name(input_file_path: str) -> str:
+    """<run>-cluster_metrics.csv for a <run>-server_<date>.log[.gz] or .tar.gz file"""
+    run = os.path.basename(input_file_path).split('-server', 1)[0]
+    for suffix in ('.tar.gz', '.tgz', '.tar', '.gz', LOG_SUFFIX):
+        if run.endswith(suffix):
+            run = run[:-len(suffix)]
+    return f"{run}-cluster_metrics.csv"
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract the Overall State records of allocator server logs")
+    parser.add_argument("inputs", nargs='+', help="Server logs: plain .log, .gz or .tar.gz archives")
+    parser.add_argument("--output", help="Output CSV (only with a single input)")
+    parser.add_argument("--output-dir", default='.', help="Directory for <run>-cluster_metrics.csv files")
+
+    args = parser.parse_args()
+    if args.output and len(args.inputs) > 1:
+        parser.error("--output needs a single input; use --output-dir for several")
+
+    for input_file in args.inputs:
+        output_file = args.output or os.path.join(args.output_dir, output_name(input_file))
+        print(f"{input_file} -> {output_file}")
+        parse_log_file(input_file, output_file)
+
+# Example usage:
+#   python3 logparse.py mwf5-server_2025-03-24T10-37-55-572Z.tar.gz mwf7-server_2025-03-29T13-41-05-669Z.tar.gz
 if __name__ == "__main__":
-    input_file = "mwf3-server_2024-11-10T14-33-21-818Z.log"  # Replace with your log file path
-    output_file = "cluster_metrics.csv"  # Output CSV file name
-    parse_log_file(input_file, output_file)
\ No newline at end of file
+    main()
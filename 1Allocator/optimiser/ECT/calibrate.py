@@ -0,0 +1,133 @@
+"""
+Calibrate node speed and job type work from observed job durations
+
+Fits duration = work[job type] / speed[node] to the observations by least squares in
+log space, log(duration) = log(work) - log(speed), with the geometric mean node speed
+fixed at 1. work is therefore the runtime in seconds on an average node, and speed
+is how much faster (> 1) or slower (< 1) a node runs than that average.
+
+Observations come from CSV files with job_type (or job) and node (or resource_id)
+columns plus duration (or start and end), such as the output of EEC/attribution.py,
+or straight from emwos-allocator server logs (allocate -> release time of each slot).
+Zero-length intervals (sub-second jobs) are ignored.
+
+The factor table is loaded by ECT (ect_function.load_factor_table) and by the Md-*
+schedulers through the workflow registry.
+
+Usage:
+    python3 calibrate.py --log mwf5-server_2025-03-24T10-37-55-572Z.tar.gz --output calibrated_factors.json
+    python3 calibrate.py --csv attributed.csv run2.csv --output calibrated_factors.json
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+# Add EEC and logs directories to Python path for importing the allocator log parsers,
+# and multi-wf for classifying jobs like the schedulers do
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'EEC'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'logs'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..',
+                             'Energy-Aware-User-Prioritised-Preference-Scheduler', 'multi-wf'))
+from workflow_registry import classify_job, detect_family
+
+FACTOR_TABLE_VERSION = 1
+
+def read_csv_observations(filename: str, family: Optional[str] = None) -> List[Tuple[str, str, float]]:
+    """(job type, node, duration) observations from a CSV file"""
+    observations = []
+    with open(filename, 'r', newline='') as f:
+        for row in csv.DictReader(f):
+            job_type = row.get('job_type')
+            if not job_type:
+                job_type = classify_job(family or detect_family(row['job']), row['job'])
+            node = row.get('node') or row['resource_id']
+            if row.get('duration'):
+                duration = float(row['duration'])
+            else:
+                duration = float(row['end']) - float(row['start'])
+            observations.append((job_type, node.split('@', 1)[-1], duration))
+    return observations
+
+def read_log_observations(filename: str, family: Optional[str] = None) -> List[Tuple[str, str, float]]:
+    """(job type, node, duration) observations from an allocator server log (.log, .gz or .tar.gz)"""
+    from attribution import parse_allocations
+    from logparse import iter_log_lines
+    intervals = parse_allocations(iter_log_lines(filename))
+    return [(classify_job(family or detect_family(i['job']), i['job']), i['node'], float(i['end'] - i['start']))
+            for i in intervals]
+
+def fit(observations: Iterable[Tuple[str, str, float]]) -> Dict:
+    """
+    Solve for per-type work and per-node speed in one least-squares fit
+
+    :param observations: (job type, node, duration in seconds) tuples
+    :return: Factor table with type_work, node_speed and fit statistics
+    """
+    observations = [o for o in observations if o[2] > 0]
+    if not observations:
+        raise ValueError("No observations with a positive duration")
+
+    types, type_index = np.unique([o[0] for o in observations], return_inverse=True)
+    nodes, node_index = np.unique([o[1] for o in observations], return_inverse=True)
+    durations = np.array([o[2] for o in observations], dtype=float)
+    n, t = len(observations), len(types)
+
+    # Columns: log(work) per type, then log(speed) per node
+    design = np.zeros((n + 1, t + len(nodes)))
+    rows = np.arange(n)
+    design[rows, type_index] = 1
+    design[rows, t + node_index] = -1
+    # Gauge row: the log speeds sum to zero (geometric mean speed of 1)
+    design[n, t:] = 1
+    target = np.append(np.log(durations), 0.0)
+
+    solution, _, _, _ = np.linalg.lstsq(design, target, rcond=None)
+    residuals = design[:n] @ solution - target[:n]
+
+    return {
+        'version': FACTOR_TABLE_VERSION,
+        'type_work': {str(job_type): float(w) for job_type, w in zip(types, np.exp(solution[:t]))},
+        'node_speed': {str(node): float(s) for node, s in zip(nodes, np.exp(solution[t:]))},
+        'observations': n,
+        'type_counts': {str(job_type): int(c) for job_type, c in zip(types, np.bincount(type_index))},
+        'node_counts': {str(node): int(c) for node, c in zip(nodes, np.bincount(node_index))},
+        'rmse_log': float(np.sqrt(np.mean(residuals ** 2)))
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit node speed and job type work from observed durations")
+    parser.add_argument("--csv", nargs='+', default=[], help="CSV file(s) of observed durations")
+    parser.add_argument("--log", nargs='+', default=[], help="emwos-allocator server log(s), plain or archived")
+    parser.add_argument("--family", help="Workflow family of the jobs (default: detect it from each job name)")
+    parser.add_argument("--output", default="calibrated_factors.json", help="Factor table to write")
+
+    args = parser.parse_args()
+    if not args.csv and not args.log:
+        parser.error("Give at least one --csv or --log file")
+
+    observations = []
+    for filename in args.csv:
+        observations.extend(read_csv_observations(filename, args.family))
+    for filename in args.log:
+        observations.extend(read_log_observations(filename, args.family))
+
+    table = fit(observations)
+    with open(args.output, 'w') as f:
+        json.dump(table, f, indent=2)
+
+    print(f"Fitted {len(table['type_work'])} job types and {len(table['node_speed'])} nodes "
+          f"from {table['observations']} observations (RMSE {table['rmse_log']:.3f} in log space)")
+    print("\nNode speed:")
+    for node, speed in sorted(table['node_speed'].items(), key=lambda item: -item[1]):
+        print(f"  {node}: {speed:.3f}")
+    print("\nJob type work (seconds on an average node):")
+    for job_type, work in sorted(table['type_work'].items()):
+        print(f"  {job_type}: {work:.2f}")
+    print(f"\nFactor table written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
+import json
 import math
+import numpy as np
 
 def load_factor(current_state):
     """Calculate load factor based on current CPU load."""
@@ -11,6 +13,37 @@ def historical_adjustment(job, resource, historical_data):
         return historical_data[job_type][resource['id']]
     return 1.0
 
+def load_factor_table(filename, mips_performance, job_types=None):
+    """
+    Load a calibrated factor table (see calibrate.py) as historical data for ect.
+    
+    The calibrated model is duration = work / speed, while ect already scales the base
+    time by each node's MIPS. The adjustment of a node is therefore only the part of its
+    slowdown the MIPS ratings miss: (MIPS / geometric-mean MIPS) / speed, the means
+    taken over the nodes in both the table and mips_performance. Nodes without a MIPS
+    rating get no adjustment. type_work is not used here; ect takes the work of a job
+    from its cpu_instructions.
+    
+    :param filename: Factor table JSON written by calibrate.py
+    :param mips_performance: Dict of resource id -> MIPS, as in the resources given to ect
+    :param job_types: Job types to include (default: all types in the table)
+    :return: Dict of job type -> resource id -> adjustment factor
+    """
+    with open(filename, 'r') as f:
+        table = json.load(f)
+    nodes = [node for node in table['node_speed'] if node in mips_performance]
+    node_factors = {}
+    if nodes:
+        mips = np.array([mips_performance[node] for node in nodes], dtype=float)
+        speed = np.array([table['node_speed'][node] for node in nodes], dtype=float)
+        # Renormalize the speeds to a geometric mean of 1 over these nodes, like the MIPS
+        speed = speed / np.exp(np.mean(np.log(speed)))
+        relative_mips = mips / np.exp(np.mean(np.log(mips)))
+        node_factors = {node: float(f) for node, f in zip(nodes, relative_mips / speed)}
+    if job_types is None:
+        job_types = table['type_work']
+    return {job_type: dict(node_factors) for job_type in job_types}
+
 def estimate_transfer_time(data_size, bandwidth, network_load, cpu_load_source, cpu_load_dest):
     """
     Estimate time to transfer data between resources.
@@ -33,6 +66,106 @@ def estimate_transfer_time(data_size, bandwidth, network_load, cpu_load_source,
     
     return base_transfer_time * cpu_factor
 
+def max_min_rates(rate_limits, capacity):
+    """
+    Max-min fair rates of flows sharing one link.
+    
+    Flows whose own limit is below their fair share keep their limit; the capacity they
+    leave is shared equally by the rest (water-filling).
+    
+    :param rate_limits: Maximum rate of each flow in bytes per second (inf if unlimited)
+    :param capacity: Link capacity in bytes per second
+    :return: Rate of each flow in bytes per second
+    """
+    limits = np.asarray(rate_limits, dtype=float)
+    n = len(limits)
+    if n == 0:
+        return limits
+    order = np.argsort(limits)
+    sorted_limits = limits[order]
+    # Share each flow would get if all flows from it onwards split what the smaller ones left
+    used_before = np.concatenate(([0.0], np.cumsum(sorted_limits[:-1])))
+    shares = (capacity - used_before) / (n - np.arange(n))
+    saturated = np.nonzero(sorted_limits > shares)[0]
+    sorted_rates = sorted_limits.copy()
+    if len(saturated):
+        first = saturated[0]
+        sorted_rates[first:] = shares[first]
+    rates = np.empty(n)
+    rates[order] = sorted_rates
+    return rates
+
+def fair_share_completion_times(data_sizes, bandwidth, start_times=None, rate_limits=None):
+    """
+    Completion times of transfers sharing one link under max-min fairness.
+    
+    Event driven: rates are recomputed only when a transfer starts or finishes and are
+    constant in between.
+    
+    :param data_sizes: Bytes to transfer per flow
+    :param bandwidth: Link bandwidth in bytes per second
+    :param start_times: Start time of each flow in seconds (default: all at 0)
+    :param rate_limits: Per-flow rate cap in bytes per second (default: none)
+    :return: Completion time of each flow in seconds (inf if it never gets bandwidth)
+    """
+    sizes = np.asarray(data_sizes, dtype=float)
+    n = len(sizes)
+    starts = np.zeros(n) if start_times is None else np.asarray(start_times, dtype=float)
+    limits = np.full(n, np.inf) if rate_limits is None else np.asarray(rate_limits, dtype=float)
+    
+    remaining = sizes.copy()
+    finish = np.where(sizes <= 0, starts, np.nan)
+    arrivals = [i for i in np.argsort(starts, kind='stable') if sizes[i] > 0]
+    active = np.zeros(n, dtype=bool)
+    next_arrival = 0
+    now = starts[arrivals[0]] if arrivals else 0.0
+    
+    while next_arrival < len(arrivals) or active.any():
+        while next_arrival < len(arrivals) and starts[arrivals[next_arrival]] <= now:
+            active[arrivals[next_arrival]] = True
+            next_arrival += 1
+        if not active.any():
+            now = starts[arrivals[next_arrival]]
+            continue
+        
+        flows = np.nonzero(active)[0]
+        rates = max_min_rates(limits[flows], bandwidth)
+        # A flow without bandwidth (link fully loaded, or a zero cap) never finishes; it
+        # uses no capacity, so dropping it leaves the other rates unchanged
+        stalled = rates <= 0
+        if stalled.any():
+            finish[flows[stalled]] = np.inf
+            active[flows[stalled]] = False
+            continue
+        step = np.min(remaining[flows] / rates)
+        if next_arrival < len(arrivals):
+            step = min(step, starts[arrivals[next_arrival]] - now)
+        
+        remaining[flows] -= rates * step
+        now += step
+        done = flows[remaining[flows] <= sizes[flows] * 1e-12]
+        finish[done] = now
+        remaining[done] = 0
+        active[done] = False
+    
+    return finish
+
+def estimate_shared_transfer_time(data_size, bandwidth, network_load, cpu_load_source, cpu_load_dest,
+                                  concurrent_transfers):
+    """
+    Estimate transfer time when other transfers share the same link.
+    
+    Like estimate_transfer_time, but the effective bandwidth is shared max-min fairly with
+    the concurrent transfers, all starting together.
+    
+    :param concurrent_transfers: Sizes in bytes of the other transfers on the link
+    :return: Estimated transfer time in seconds
+    """
+    effective_bandwidth = bandwidth * (1 - network_load / 100)
+    completion = fair_share_completion_times([data_size] + list(concurrent_transfers), effective_bandwidth)
+    cpu_factor = 1 + (cpu_load_source / 200) + (cpu_load_dest / 200)
+    return completion[0] * cpu_factor
+
 def ect(job, resource, historical_data, current_state, data_source, network_info):
     """
     Calculate Estimated Completion Time (ECT) for a job on a resource, including data transfer time.
@@ -42,7 +175,8 @@ def ect(job, resource, historical_data, current_state, data_source, network_info
     :param historical_data: Dict containing historical performance data
     :param current_state: Dict containing current state of the resource
     :param data_source: Dict containing information about the data source
-    :param network_info: Dict containing network information
+    :param network_info: Dict containing network information; an optional
+                         'concurrent_transfers' list of sizes (bytes) shares the link
     :return: Estimated completion time in seconds
     """
     # Estimate computation time in s
@@ -53,17 +187,90 @@ def ect(job, resource, historical_data, current_state, data_source, network_info
     computation_time = base_time * load_adj * hist_adj
     
     # Estimate data transfer time in s
-    transfer_time = estimate_transfer_time(
-        job['data_size'],
-        network_info['bandwidth'],
-        network_info['load'],
-        data_source['cpu_load'],
-        current_state['cpu_load']
-    )
+    if network_info.get('concurrent_transfers'):
+        transfer_time = estimate_shared_transfer_time(
+            job['data_size'],
+            network_info['bandwidth'],
+            network_info['load'],
+            data_source['cpu_load'],
+            current_state['cpu_load'],
+            network_info['concurrent_transfers']
+        )
+    else:
+        transfer_time = estimate_transfer_time(
+            job['data_size'],
+            network_info['bandwidth'],
+            network_info['load'],
+            data_source['cpu_load'],
+            current_state['cpu_load']
+        )
     
     # Total estimated time is sum of transfer time and computation time
     return transfer_time + computation_time
 
+def historical_matrix(job_types, resource_ids, historical_data):
+    """
+    Build the historical adjustment factors for every job/resource pair.
+    
+    :param job_types: Sequence of job types, one per job
+    :param resource_ids: Sequence of resource ids, one per resource
+    :param historical_data: Dict containing historical performance data (as for ect)
+    :return: Array of shape (jobs, resources), 1.0 where no history exists
+    """
+    resource_index = {resource_id: i for i, resource_id in enumerate(resource_ids)}
+    unique_types, type_index = np.unique(np.asarray(job_types, dtype=object).astype(str), return_inverse=True)
+    
+    # One row per distinct job type, then expanded to one row per job
+    type_factors = np.ones((len(unique_types), len(resource_ids)))
+    for row, job_type in enumerate(unique_types):
+        for resource_id, factor in historical_data.get(job_type, {}).items():
+            if resource_id in resource_index:
+                type_factors[row, resource_index[resource_id]] = factor
+    return type_factors[type_index.reshape(-1)]
+
+def ect_batch(cpu_instructions, data_size, mips_performance, cpu_load, bandwidth, network_load,
+              source_cpu_load, hist_factors=None, concurrent_transfers=False):
+    """
+    Calculate the Estimated Completion Time of every job on every resource in one call.
+    
+    Same model as ect(): arguments may be scalars or arrays and are broadcast as below.
+    
+    :param cpu_instructions: Instruction count per job, shape (jobs,)
+    :param data_size: Data to transfer per job in bytes, shape (jobs,)
+    :param mips_performance: MIPS per resource, shape (resources,)
+    :param cpu_load: Current CPU load per resource as a percentage, shape (resources,)
+    :param bandwidth: Network bandwidth in bytes per second, scalar or shape (resources,)
+    :param network_load: Network load as a percentage, scalar or shape (resources,)
+    :param source_cpu_load: CPU load of the data source as a percentage, scalar or shape (jobs,)
+    :param hist_factors: Historical adjustment factors, shape (jobs, resources) (see historical_matrix)
+    :param concurrent_transfers: Treat the jobs' transfers as running together on one shared
+                                 link (scalar bandwidth and network_load), e.g. a fan-out wave
+    :return: Estimated completion times in seconds, shape (jobs, resources)
+    """
+    instructions = np.atleast_1d(np.asarray(cpu_instructions, dtype=float))[:, None]
+    data = np.atleast_1d(np.asarray(data_size, dtype=float))[:, None]
+    source_load = np.asarray(source_cpu_load, dtype=float)
+    if source_load.ndim:
+        source_load = source_load[:, None]
+    mips = np.atleast_1d(np.asarray(mips_performance, dtype=float))
+    load = np.asarray(cpu_load, dtype=float)
+    
+    # Computation time: base time * load factor * historical adjustment
+    computation_time = instructions / (mips * 1000000) * (1 + load / 100)
+    if hist_factors is not None:
+        computation_time = computation_time * hist_factors
+    
+    # Transfer time with effective bandwidth and CPU load at both ends
+    effective_bandwidth = np.asarray(bandwidth, dtype=float) * (1 - np.asarray(network_load, dtype=float) / 100)
+    cpu_factor = 1 + (source_load / 200) + (load / 200)
+    if concurrent_transfers:
+        base_transfer_time = fair_share_completion_times(data[:, 0], float(effective_bandwidth))[:, None]
+    else:
+        base_transfer_time = data / effective_bandwidth
+    transfer_time = base_transfer_time * cpu_factor
+    
+    return transfer_time + computation_time
+
 # Example usage
 if __name__ == "__main__":
     job = {
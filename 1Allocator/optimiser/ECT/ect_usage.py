@@ -1,4 +1,4 @@
-from ect_function import ect
+from ect_function import ect_batch, historical_matrix
 
 job = {
     'id': 'mProject',
@@ -46,6 +46,18 @@ network_info = {
     'load': 0  # 0% network load
 }
 
+# All resources in one call; rows are jobs, columns are resources
+hist_factors = historical_matrix([job['type']], [r['id'] for r in resource], historical_data)
+estimated_times = ect_batch(
+    [job['cpu_instructions']],
+    [job['data_size']],
+    [r['mips_performance'] for r in resource],
+    [current_state['cpu_load']] * len(resource),
+    network_info['bandwidth'],
+    network_info['load'],
+    data_source['cpu_load'],
+    hist_factors
+)
+
 for x in range(len(resource)):
-    estimated_time = ect(job, resource[x], historical_data, current_state, data_source, network_info)
-    print(f"Estimated Completion Time on {resource[x]['id']} : {estimated_time:.2f} seconds")
\ No newline at end of file
+    print(f"Estimated Completion Time on {resource[x]['id']} : {estimated_times[0, x]:.2f} seconds")
\ No newline at end of file
@@ -0,0 +1,216 @@
+"""
+Live load snapshot for ECT/EEC from the 2Monitoring CSVs
+
+Tails the CSVs the monitoring scripts append to every second and keeps the latest
+values in an in-memory table, so estimates can use the current load instead of 0:
+
+- condor_status_total_stats_*.csv: cluster busy share (Claimed / Total slots)
+- condor_status_individual_slot_activity_*.csv: per-node busy share of its slots
+- freem_memory_total_stats_*.csv: memory used share
+- plug power CSV (timestamp, ..., p1..p20): per-node power, with a node -> plug map
+
+Only new bytes are read on each poll and only the last complete row of each file is
+parsed. The table is replaced as a whole on every refresh (copy on write), so readers
+never lock: they get either the old or the new snapshot. Values older than the TTL
+(by their CSV timestamp) are treated as missing.
+
+There is no network monitor in 2Monitoring, so network_info['load'] stays with the caller.
+
+Usage:
+    snapshot = LoadSnapshot(status_file='condor_status_total_stats_mwf2.csv', ttl=5)
+    snapshot.start()
+    state = snapshot.current_state('alpha')   # {'cpu_load': ...}
+"""
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+CLUSTER = '_cluster'
+# Bytes read from the end of an existing file on the first poll
+INITIAL_TAIL_BYTES = 65536
+
+class CSVTail:
+    def __init__(self, path: str):
+        """Follow a CSV file that is appended to, returning its newest row"""
+        self.path = path
+        self.header: Optional[List[str]] = None
+        self.offset = 0
+        self.inode = None
+        self.partial = b''
+
+    def latest(self) -> Optional[Dict[str, str]]:
+        """Newest complete row since the last call, or None if nothing new was written"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            # New or truncated file: start again from its header
+            self.inode = stat.st_ino
+            self.header = None
+            self.offset = 0
+            self.partial = b''
+        if stat.st_size == self.offset:
+            return None
+
+        with open(self.path, 'rb') as f:
+            if self.header is None:
+                header = f.readline()
+                if not header.endswith(b'\n'):
+                    return None
+                self.header = header.decode().strip().split(',')
+                self.offset = max(f.tell(), stat.st_size - INITIAL_TAIL_BYTES)
+                # Jumping into the middle of the file: drop the cut-off first line
+                self.partial = b'' if self.offset == f.tell() else None
+            f.seek(self.offset)
+            data = f.read()
+        self.offset += len(data)
+
+        lines = data.split(b'\n')
+        if self.partial is None:
+            lines = lines[1:]
+            self.partial = b''
+        else:
+            lines[0] = self.partial + lines[0]
+        self.partial = lines.pop() if lines else b''
+
+        for line in reversed(lines):
+            if line.strip():
+                return dict(zip(self.header, line.decode(errors='replace').strip().split(',')))
+        return None
+
+def _number(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+class LoadSnapshot:
+    def __init__(self, status_file: Optional[str] = None, slot_activity_file: Optional[str] = None,
+                 memory_file: Optional[str] = None, power_file: Optional[str] = None,
+                 plug_map: Optional[Dict[str, str]] = None, ttl: float = 5.0):
+        """
+        :param status_file: condor_status_total_stats CSV
+        :param slot_activity_file: condor_status_individual_slot_activity CSV
+        :param memory_file: freem_memory_total_stats CSV
+        :param power_file: Plug power CSV
+        :param plug_map: Node -> plug column of the power CSV (e.g. {"alpha": "p1"})
+        :param ttl: Seconds a value stays valid after its CSV timestamp
+        """
+        self.ttl = ttl
+        self.plug_map = plug_map or {}
+        self.tails = {name: CSVTail(path) for name, path in (
+            ('status', status_file), ('slots', slot_activity_file),
+            ('memory', memory_file), ('power', power_file)) if path}
+        # node (or CLUSTER) -> {'timestamp': ..., value name: value}
+        self.table: Dict[str, Dict[str, float]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def refresh(self) -> bool:
+        """Read new rows from all files; returns True if the table changed"""
+        updates: Dict[str, Dict[str, float]] = {}
+        for name, tail in self.tails.items():
+            row = tail.latest()
+            if row is None:
+                continue
+            timestamp = _number(row.get('Timestamp', row.get('timestamp')))
+            if timestamp is None:
+                continue
+            getattr(self, f'_read_{name}')(row, timestamp, updates)
+
+        if not updates:
+            return False
+        table = dict(self.table)
+        for key, values in updates.items():
+            table[key] = dict(table.get(key, {}), **values)
+        self.table = table
+        return True
+
+    def _read_status(self, row: Dict[str, str], timestamp: float, updates: Dict):
+        total = _number(row.get('Total'))
+        claimed = _number(row.get('Claimed'))
+        if total and claimed is not None:
+            updates.setdefault(CLUSTER, {}).update(
+                cpu_load=claimed / total * 100, cpu_load_timestamp=timestamp)
+
+    def _read_slots(self, row: Dict[str, str], timestamp: float, updates: Dict):
+        busy: Dict[str, List[int]] = {}
+        for slot, activity in row.items():
+            if '@' not in slot:
+                continue
+            node = slot.split('@', 1)[1].split('.', 1)[0]
+            counts = busy.setdefault(node, [0, 0])
+            counts[0] += activity == 'Busy'
+            counts[1] += 1
+        for node, (busy_slots, slots) in busy.items():
+            updates.setdefault(node, {}).update(
+                cpu_load=busy_slots / slots * 100, cpu_load_timestamp=timestamp)
+
+    def _read_memory(self, row: Dict[str, str], timestamp: float, updates: Dict):
+        total = _number(row.get('Total'))
+        used = _number(row.get('Used'))
+        if total and used is not None:
+            updates.setdefault(CLUSTER, {}).update(
+                memory_used=used / total * 100, memory_used_timestamp=timestamp)
+
+    def _read_power(self, row: Dict[str, str], timestamp: float, updates: Dict):
+        for node, column in self.plug_map.items():
+            power = _number(row.get(column))
+            if power is not None:
+                updates.setdefault(node, {}).update(power=power, power_timestamp=timestamp)
+
+    def get(self, node: str, name: str) -> Optional[float]:
+        """Latest value of a node (or CLUSTER), None if unknown or older than the TTL"""
+        values = self.table.get(node)
+        if values is None or name not in values:
+            return None
+        if time.time() - values[f'{name}_timestamp'] > self.ttl:
+            return None
+        return values[name]
+
+    def current_state(self, node: Optional[str] = None, default_load: float = 0.0) -> Dict[str, float]:
+        """
+        current_state dict for ect()/eec()
+
+        Uses the node's own busy share if known, else the cluster's, else default_load.
+        """
+        cpu_load = self.get(node, 'cpu_load') if node else None
+        if cpu_load is None:
+            cpu_load = self.get(CLUSTER, 'cpu_load')
+        return {'cpu_load': default_load if cpu_load is None else cpu_load}
+
+    def start(self, interval: float = 1.0):
+        """Refresh in a daemon thread every interval seconds"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.is_set():
+                self.refresh()
+                self._stop.wait(interval)
+
+        self._thread = threading.Thread(target=run, name='load-snapshot', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+# Example usage
+if __name__ == "__main__":
+    monitoring = '../../../2Monitoring/0ExtraMonitoring/mwf2/'
+    snapshot = LoadSnapshot(
+        status_file=monitoring + 'condor_status_total_stats_mwf2.csv',
+        memory_file=monitoring + 'freem_memory_total_stats_mwf2.csv',
+        power_file=monitoring + 'mwf2.csv',
+        plug_map={'alpha': 'p1'},
+        ttl=float('inf')  # recorded files: accept old timestamps
+    )
+    snapshot.refresh()
+    print(f"Snapshot: {snapshot.table}")
+    print(f"Current state of alpha: {snapshot.current_state('alpha')}")
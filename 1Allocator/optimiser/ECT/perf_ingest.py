@@ -0,0 +1,195 @@
+"""
+Bulk ingestion of perf stat outputs into the predictor training set
+
+Reads the text that `perf stat` prints (or writes with -o) and turns each file into a
+training run for PerformancePredictor.train_batch, instead of copying counters by hand.
+
+Each directory of outputs carries a descriptors.json with the scenario of its runs:
+
+    {
+      "hardware": {"cpu_model": "i7-12700", "generation": 12, ...},
+      "software": {"threads_allocated": 8, "cpu_affinity": [0, 1, 2, 3], ...},
+      "workload": {"app_name": "montage", "version": "1.5", ...},
+      "background_processes": 0,
+      "runs": {"mProject_bg2.txt": {"background_processes": 2}}
+    }
+
+The fields are those of HardwareProfile, SoftwareConfig and WorkloadProfile.
+Subdirectories inherit their parent's descriptors and override single fields, and
+"runs" overrides fields for individual files.
+
+Hybrid CPUs report counters per core type (cpu_core/cycles/, cpu_atom/cycles/); these
+are summed. Counters that were <not counted> or <not supported> are left out of the
+run, and the predictor's model of an unmeasured metric skips that run.
+
+Every run records its file path, and files already in the history of the model given
+with --model are not ingested again.
+
+Usage:
+    python3 perf_ingest.py perf_runs/ --output predictor_model.joblib
+"""
+import argparse
+import fnmatch
+import json
+import os
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+DESCRIPTOR_FILE = 'descriptors.json'
+
+# perf event name -> PerformanceMetrics key
+EVENTS = {
+    'context-switches': 'context_switches',
+    'cs': 'context_switches',
+    'cpu-migrations': 'cpu_migrations',
+    'migrations': 'cpu_migrations',
+    'page-faults': 'page_faults',
+    'faults': 'page_faults',
+    'cycles': 'cycles',
+    'instructions': 'instructions',
+    'branches': 'branches',
+    'branch-misses': 'branch_misses',
+    'L1-dcache-loads': 'l1_dcache_loads',
+    'L1-dcache-load-misses': 'l1_dcache_load_misses',
+    'LLC-loads': 'llc_loads',
+    'LLC-load-misses': 'llc_load_misses'
+}
+
+# "   978,149,994,336      cycles      # 2.793 GHz", "351,030.12 msec task-clock"
+COUNTER_PATTERN = re.compile(r'^\s*([\d,.]+)\s+(?:(msec)\s+)?(\S+)')
+ELAPSED_PATTERN = re.compile(r'^\s*([\d,.]+)\s+seconds time elapsed')
+HYBRID_PREFIX = re.compile(r'^cpu_\w+/([^/]+)/')
+
+def _number(text: str) -> float:
+    return float(text.replace(',', ''))
+
+def parse_perf_stat(lines: Iterable[str]) -> Dict[str, float]:
+    """
+    Metrics of one perf stat output, with the derived ipc, llc_miss_rate and effective_clock
+
+    :param lines: Lines of the perf stat text output
+    :return: PerformanceMetrics keys found in the output
+    """
+    metrics: Dict[str, float] = {}
+    task_clock_ms = None
+    for line in lines:
+        match = ELAPSED_PATTERN.match(line)
+        if match:
+            metrics['execution_time'] = _number(match.group(1))
+            continue
+        match = COUNTER_PATTERN.match(line)
+        if not match:
+            continue
+        value, msec, event = match.groups()
+        hybrid = HYBRID_PREFIX.match(event)
+        if hybrid:
+            event = hybrid.group(1)
+        event = event.split(':', 1)[0]
+        if event == 'task-clock' or (msec and event == 'cpu-clock'):
+            task_clock_ms = _number(value)
+        elif event in EVENTS:
+            key = EVENTS[event]
+            metrics[key] = metrics.get(key, 0) + _number(value)
+
+    if metrics.get('cycles'):
+        if 'instructions' in metrics:
+            metrics['ipc'] = metrics['instructions'] / metrics['cycles']
+        seconds = task_clock_ms / 1000 if task_clock_ms else metrics.get('execution_time')
+        if seconds:
+            metrics['effective_clock'] = metrics['cycles'] / seconds / 1e9
+    if metrics.get('llc_loads') and 'llc_load_misses' in metrics:
+        metrics['llc_miss_rate'] = metrics['llc_load_misses'] / metrics['llc_loads'] * 100
+    return metrics
+
+def merge_descriptors(base: Dict, override: Dict) -> Dict:
+    """Descriptors with override's fields replacing base's, one level into hardware/software/workload"""
+    merged = dict(base)
+    for key, value in override.items():
+        if key == 'runs':
+            continue
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = dict(merged[key], **value)
+        else:
+            merged[key] = value
+    return merged
+
+def to_run(descriptors: Dict, metrics: Dict[str, float], source: Optional[str] = None) -> Dict:
+    """train_batch run from merged descriptors and parsed metrics"""
+    from predictor import HardwareProfile, SoftwareConfig, WorkloadProfile
+    return {
+        'hardware': HardwareProfile(**descriptors['hardware']),
+        'software': SoftwareConfig(**descriptors['software']),
+        'workload': WorkloadProfile(**descriptors['workload']),
+        'background_processes': descriptors.get('background_processes', 0),
+        'metrics': metrics,
+        'source': source
+    }
+
+def iter_runs(root: str, pattern: str = '*.txt',
+              skipped: Optional[List[Tuple[str, str]]] = None) -> Iterator[Dict]:
+    """
+    Walk a directory tree once, yielding a train_batch run per perf stat output
+
+    :param root: Top directory
+    :param pattern: File name pattern of the perf stat outputs
+    :param skipped: If given, (path, reason) of every file that was not ingested is appended
+    """
+    inherited = {root: {}}
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories.sort()
+        descriptors = inherited.pop(directory)
+        runs = {}
+        if DESCRIPTOR_FILE in files:
+            with open(os.path.join(directory, DESCRIPTOR_FILE), 'r') as f:
+                local = json.load(f)
+            descriptors = merge_descriptors(descriptors, local)
+            runs = local.get('runs', {})
+        for subdirectory in subdirectories:
+            inherited[os.path.join(directory, subdirectory)] = descriptors
+
+        for name in sorted(fnmatch.filter(files, pattern)):
+            path = os.path.join(directory, name)
+            run_descriptors = merge_descriptors(descriptors, runs.get(name, {}))
+            with open(path, 'r', errors='replace') as f:
+                metrics = parse_perf_stat(f)
+            try:
+                if 'execution_time' not in metrics:
+                    raise ValueError("no 'seconds time elapsed' line")
+                yield to_run(run_descriptors, metrics, os.path.abspath(path))
+            except (KeyError, TypeError, ValueError) as error:
+                if skipped is not None:
+                    skipped.append((path, str(error)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the performance predictor from perf stat outputs")
+    parser.add_argument("roots", nargs='+', help="Directories of perf stat outputs with descriptors.json")
+    parser.add_argument("--pattern", default='*.txt', help="File name pattern of the outputs")
+    parser.add_argument("--model", help="Existing model (PerformancePredictor.save) to add the runs to")
+    parser.add_argument("--output", default='predictor_model.joblib', help="Model file to write")
+
+    args = parser.parse_args()
+
+    from predictor import PerformancePredictor
+    predictor = PerformancePredictor.load(args.model) if args.model else PerformancePredictor()
+
+    skipped: List[Tuple[str, str]] = []
+    ingested = {h['source'] for h in predictor.history if 'source' in h}
+    runs = []
+    for root in args.roots:
+        for run in iter_runs(root, args.pattern, skipped):
+            if run['source'] in ingested:
+                skipped.append((run['source'], "already in the model's history"))
+            else:
+                runs.append(run)
+    for path, reason in skipped:
+        print(f"Skipped {path}: {reason}")
+    if not runs:
+        print("No new perf stat outputs found, model not written")
+        return
+
+    predictor.train_batch(runs)
+    predictor.save(args.output)
+    print(f"Trained on {len(runs)} runs ({len(predictor.history)} in history), model written to {args.output}")
+
+if __name__ == "__main__":
+    main()
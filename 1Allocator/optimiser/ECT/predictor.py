@@ -1,18 +1,26 @@
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import LabelEncoder
+from sklearn.base import BaseEstimator, RegressorMixin
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import QuantileRegressor
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 import json
 import datetime
+import time
 import warnings
 from sklearn.exceptions import DataConversionWarning
+import joblib
+from joblib import Parallel, delayed
 
 # Suppress warnings
 warnings.filterwarnings('ignore', category=UserWarning)
 warnings.filterwarnings('ignore', category=DataConversionWarning)
 
+# Bump when _raw_features changes its columns or encoding; saved models of another
+# version are refused instead of silently predicting from misaligned features
+FEATURE_SCHEMA_VERSION = 1
+
 @dataclass
 class HardwareProfile:
     cpu_model: str
@@ -65,42 +73,150 @@ class PerformanceMetrics:
             if key in self.metrics:
                 self.metrics[key] = value
 
-class PerformancePredictor:
+class CategoricalVocabulary:
+    """Append-only code table per categorical column; a value keeps its code forever"""
+    UNKNOWN = -1
+
     def __init__(self):
-        self.label_encoders = {}
-        self.models = {
-            'execution_time': RandomForestRegressor(n_estimators=100, random_state=42),
-            'cpu_migrations': RandomForestRegressor(n_estimators=100, random_state=42),
-            'context_switches': RandomForestRegressor(n_estimators=100, random_state=42),
-            'llc_miss_rate': RandomForestRegressor(n_estimators=100, random_state=42),
-            'effective_clock': RandomForestRegressor(n_estimators=100, random_state=42)
-        }
+        self.codes: Dict[str, Dict[str, int]] = {}
+
+    def encode(self, column: str, value: str, grow: bool = True) -> int:
+        """Code of a value, appending it to the column if new (UNKNOWN if grow is False)"""
+        codes = self.codes.setdefault(column, {})
+        code = codes.get(value)
+        if code is None:
+            if not grow:
+                return self.UNKNOWN
+            code = codes[value] = len(codes)
+        return code
+
+    def to_dict(self) -> Dict[str, List[str]]:
+        """Values of each column in code order"""
+        return {column: sorted(codes, key=codes.get) for column, codes in self.codes.items()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, List[str]]) -> 'CategoricalVocabulary':
+        vocabulary = cls()
+        vocabulary.codes = {column: {value: code for code, value in enumerate(values)}
+                            for column, values in data.items()}
+        return vocabulary
+
+class QuantileModel(BaseEstimator, RegressorMixin):
+    """
+    Predicts the 10th, 50th and 90th percentiles directly, one regressor per quantile
+
+    kind 'gbr' uses gradient-boosted trees with the quantile loss; 'linear' uses an
+    unregularized linear quantile regression, whose inference is a single matrix product.
+    """
+    QUANTILES = (0.1, 0.5, 0.9)
+
+    def __init__(self, kind: str = 'gbr', n_estimators: int = 100, max_depth: int = 3):
+        self.kind = kind
+        self.n_estimators = n_estimators
+        self.max_depth = max_depth
+
+    def fit(self, X, y):
+        X = np.asarray(X, dtype=float)
+        y = np.asarray(y, dtype=float)
+        if self.kind == 'gbr':
+            self.estimators_ = [GradientBoostingRegressor(
+                loss='quantile', alpha=q, n_estimators=self.n_estimators, max_depth=self.max_depth,
+                random_state=42).fit(X, y) for q in self.QUANTILES]
+            self.feature_importances_ = self.estimators_[1].feature_importances_
+        elif self.kind == 'linear':
+            estimators = [QuantileRegressor(quantile=q, alpha=0.0, solver='highs').fit(X, y)
+                          for q in self.QUANTILES]
+            self.coef_ = np.array([e.coef_ for e in estimators])
+            self.intercept_ = np.array([e.intercept_ for e in estimators])
+            # Standardized effect of each feature on the median
+            effect = np.abs(self.coef_[1]) * X.std(axis=0)
+            total = effect.sum()
+            self.feature_importances_ = effect / total if total > 0 else np.zeros(X.shape[1])
+        else:
+            raise ValueError(f"Unknown quantile model kind {self.kind!r}")
+        return self
+
+    def predict_quantiles(self, X) -> np.ndarray:
+        """(3, rows) array of the 10th, 50th and 90th percentile, sorted so they never cross"""
+        X = np.asarray(X, dtype=float)
+        if self.kind == 'linear':
+            quantiles = self.coef_ @ X.T + self.intercept_[:, None]
+        else:
+            quantiles = np.stack([e.predict(X) for e in self.estimators_])
+        return np.sort(quantiles, axis=0)
+
+    def predict(self, X) -> np.ndarray:
+        return self.predict_quantiles(X)[1]
+
+# Model backends selectable per metric
+BACKENDS = ('forest', 'gbr_quantile', 'linear_quantile')
+
+def make_model(backend: str, n_jobs: Optional[int] = None):
+    if backend == 'forest':
+        return RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=n_jobs)
+    if backend == 'gbr_quantile':
+        return QuantileModel('gbr')
+    if backend == 'linear_quantile':
+        return QuantileModel('linear')
+    raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+
+class PerformancePredictor:
+    METRICS = ('execution_time', 'cpu_migrations', 'context_switches', 'llc_miss_rate', 'effective_clock')
+
+    def __init__(self, n_jobs: Optional[int] = None, retrain_every: int = 1,
+                 retrain_interval: Optional[float] = None, backends: Optional[Dict[str, str]] = None):
+        """
+        :param n_jobs: Parallel jobs for fitting (trees of each forest and the metrics); None is serial
+        :param retrain_every: Refit after this many new samples from train() (1: every call)
+        :param retrain_interval: Also refit when this many seconds passed since the last fit
+        :param backends: Metric -> 'forest' (default; bounds are +-2 sigma over the trees),
+                         'gbr_quantile' or 'linear_quantile' (bounds are the predicted
+                         10th/90th percentiles, much cheaper to evaluate)
+        """
+        self.n_jobs = n_jobs
+        self.retrain_every = retrain_every
+        self.retrain_interval = retrain_interval
+        self.vocabulary = CategoricalVocabulary()
+        backends = backends or {}
+        unknown = set(backends) - set(self.METRICS)
+        if unknown:
+            raise ValueError(f"Unknown metrics in backends: {sorted(unknown)}")
+        self.models = {metric_name: make_model(backends.get(metric_name, 'forest'), n_jobs)
+                       for metric_name in self.METRICS}
         self.history = []
         self.feature_importance = {}
         self.feature_columns = None
+        # Samples added since the last fit, and when that fit happened
+        self.pending_samples = 0
+        self.last_fit_time = None
+        # Distinct history feature rows with their counts, and feature importances as a
+        # (metrics, features) matrix; rebuilt on every fit for confidence scoring
+        self.history_rows = None
+        self.history_counts = None
+        self.importance_matrix = None
+        # The same history as (weighted features, distinct rows), see _index_history
+        self.confidence_features = None
+        self.history_columns = None
+        self.confidence_weights = None
+        # Metrics without a single measured run in the history; their models stay unfitted
+        self.unlabelled_metrics = set()
 
-    def _encode_categorical(self, data: Dict) -> pd.Series:
+    def _encode_categorical(self, data: Dict, grow: bool = True) -> Dict:
+        """Replace string features by their vocabulary codes"""
         encoded = {}
         for key, value in data.items():
             if isinstance(value, str):
-                if key not in self.label_encoders:
-                    self.label_encoders[key] = LabelEncoder()
-                all_values = set([value])
-                for h in self.history:
-                    if key in h['features']:
-                        all_values.add(h['features'][key])
-                self.label_encoders[key].fit(list(all_values))
-                encoded[key] = self.label_encoders[key].transform([value])[0]
+                encoded[key] = self.vocabulary.encode(key, value, grow)
             else:
                 encoded[key] = value
         return encoded
 
-    def _prepare_features(self, 
-                         hardware: HardwareProfile,
-                         software: SoftwareConfig,
-                         workload: WorkloadProfile,
-                         background_processes: int) -> pd.DataFrame:
-        features = {
+    def _raw_features(self,
+                      hardware: HardwareProfile,
+                      software: SoftwareConfig,
+                      workload: WorkloadProfile,
+                      background_processes: int) -> Dict:
+        return {
             'cpu_model': hardware.cpu_model,
             'generation': hardware.generation,
             'base_clock': hardware.base_clock,
@@ -121,8 +237,16 @@ class PerformancePredictor:
             'output_mode': workload.output_mode,
             'background_processes': background_processes
         }
+
+    def _prepare_features(self, 
+                         hardware: HardwareProfile,
+                         software: SoftwareConfig,
+                         workload: WorkloadProfile,
+                         background_processes: int,
+                         grow: bool = True) -> pd.DataFrame:
+        features = self._raw_features(hardware, software, workload, background_processes)
         
-        encoded = self._encode_categorical(features)
+        encoded = self._encode_categorical(features, grow)
         df = pd.DataFrame([encoded])
         
         if self.feature_columns is None:
@@ -138,7 +262,7 @@ class PerformancePredictor:
               workload: WorkloadProfile,
               background_processes: int,
               performance: PerformanceMetrics):
-        
+        """Add one run; the models are refit when retrain_every/retrain_interval says so"""
         features_df = self._prepare_features(hardware, software, workload, background_processes)
         
         self.history.append({
@@ -146,6 +270,58 @@ class PerformancePredictor:
             'features': features_df.iloc[0].to_dict(),
             'metrics': performance.metrics
         })
+        self.pending_samples += 1
+        
+        if self._retrain_due():
+            self.retrain()
+
+    def train_batch(self, runs: Iterable[Dict]):
+        """
+        Add many runs and fit the models once
+        
+        :param runs: Dicts with hardware, software, workload, background_processes and
+                     metrics (PerformanceMetrics or a metrics dict), optionally a source
+                     (e.g. the file the run was read from). Metrics absent from a dict, or
+                     NaN, were not measured: the model of that metric skips the run.
+        """
+        runs = list(runs)
+        if not runs:
+            return
+        rows = [self._raw_features(run['hardware'], run['software'], run['workload'],
+                                   run['background_processes']) for run in runs]
+        encoded_rows = [self._encode_categorical(row) for row in rows]
+        if self.feature_columns is None:
+            self.feature_columns = pd.DataFrame(encoded_rows[:1]).columns
+        
+        timestamp = datetime.datetime.now().isoformat()
+        for run, encoded in zip(runs, encoded_rows):
+            metrics = run['metrics']
+            if not isinstance(metrics, PerformanceMetrics):
+                performance = PerformanceMetrics()
+                performance.metrics = dict.fromkeys(performance.metrics, np.nan)
+                performance.update_from_dict(metrics)
+                metrics = performance
+            entry = {
+                'timestamp': timestamp,
+                'features': {column: encoded.get(column, 0) for column in self.feature_columns},
+                'metrics': metrics.metrics
+            }
+            if run.get('source') is not None:
+                entry['source'] = run['source']
+            self.history.append(entry)
+        self.pending_samples += len(runs)
+        self.retrain()
+
+    def _retrain_due(self) -> bool:
+        if self.pending_samples >= self.retrain_every:
+            return True
+        return (self.retrain_interval is not None and self.last_fit_time is not None and
+                time.monotonic() - self.last_fit_time >= self.retrain_interval)
+
+    def retrain(self):
+        """Refit all models on the full history if samples were added since the last fit"""
+        if not self.pending_samples or not self.history:
+            return
         
         X = pd.DataFrame([h['features'] for h in self.history])
         if self.feature_columns is None:
@@ -153,14 +329,37 @@ class PerformancePredictor:
         
         X = X.reindex(columns=self.feature_columns, fill_value=0)
         
-        for metric_name, model in self.models.items():
-            y = [h['metrics'][metric_name] for h in self.history]
-            model.fit(X, y)
-            
+        def fit(metric_name, model):
+            y = np.array([h['metrics'][metric_name] for h in self.history], dtype=float)
+            measured = np.isfinite(y)
+            if not measured.any():
+                return metric_name, None
+            return metric_name, model.fit(X[measured], y[measured])
+        
+        # Metrics in parallel threads (tree fitting releases the GIL), trees via each model's n_jobs
+        fitted = Parallel(n_jobs=self.n_jobs, prefer='threads')(
+            delayed(fit)(metric_name, model) for metric_name, model in self.models.items())
+        
+        for metric_name, model in fitted:
+            if model is None:
+                self.unlabelled_metrics.add(metric_name)
+                self.feature_importance[metric_name] = dict.fromkeys(self.feature_columns, 0.0)
+                continue
+            self.unlabelled_metrics.discard(metric_name)
             self.feature_importance[metric_name] = dict(zip(
                 self.feature_columns,
                 model.feature_importances_
             ))
+        
+        # float32 like the rows predict_batch compares against, so non-integer features can match
+        self.history_rows, self.history_counts = np.unique(X.to_numpy(dtype=np.float32), axis=0,
+                                                           return_counts=True)
+        self.importance_matrix = np.array([list(self.feature_importance[metric_name].values())
+                                           for metric_name in self.models])
+        self._index_history()
+        
+        self.pending_samples = 0
+        self.last_fit_time = time.monotonic()
 
     def predict(self,
                 hardware: HardwareProfile,
@@ -168,47 +367,186 @@ class PerformancePredictor:
                 workload: WorkloadProfile,
                 background_processes: int) -> Dict[str, float]:
         
+        # Categories never seen in training are encoded as UNKNOWN, not added
+        features_df = self.feature_matrix([{
+            'hardware': hardware,
+            'software': software,
+            'workload': workload,
+            'background_processes': background_processes
+        }])
+        batch = self.predict_batch(features_df)
+        
+        predictions = {metric_name: values[0] for metric_name, values in batch['predictions'].items()}
+        prediction_bounds = {metric_name: {'lower': bounds['lower'][0], 'upper': bounds['upper'][0]}
+                             for metric_name, bounds in batch['bounds'].items()}
+            
+        return {
+            'predictions': predictions,
+            'bounds': prediction_bounds,
+            'confidence_factors': {metric_name: float(values[0])
+                                   for metric_name, values in batch['confidence_factors'].items()}
+        }
+
+    def feature_matrix(self, scenarios: Iterable[Dict]) -> pd.DataFrame:
+        """
+        Encoded feature matrix for many scenarios, one row each
+        
+        :param scenarios: Dicts with hardware, software, workload and background_processes
+        """
+        rows = [self._encode_categorical(self._raw_features(
+                    scenario['hardware'], scenario['software'], scenario['workload'],
+                    scenario['background_processes']), grow=False)
+                for scenario in scenarios]
+        return pd.DataFrame(rows).reindex(columns=self.feature_columns, fill_value=0)
+
+    def predict_batch(self, features: pd.DataFrame) -> Dict:
+        """
+        Predictions and bounds for every row of a feature matrix
+        
+        For forests the per-tree outputs are computed once and stacked; their mean is the
+        prediction and mean +- 2 sigma the bounds. Quantile backends give the median as
+        the prediction and the 10th/90th percentiles as the bounds.
+        
+        :param features: Encoded features (see feature_matrix), columns as in training
+        :return: Dict with 'predictions' (metric -> array), 'bounds' (metric -> lower/upper
+                 arrays) and 'confidence_factors' (metric -> array); NaN for metrics
+                 that no training run measured
+        """
         if not self.history:
             raise ValueError("No training data available for prediction")
-            
-        features_df = self._prepare_features(hardware, software, workload, background_processes)
+        if self.last_fit_time is None:
+            # Deferred mode and never fitted yet
+            self.retrain()
+        
+        X = np.asarray(features.reindex(columns=self.feature_columns, fill_value=0), dtype=np.float32)
         
         predictions = {}
         prediction_bounds = {}
         
         for metric_name, model in self.models.items():
-            pred = model.predict(features_df)[0]
+            if metric_name in self.unlabelled_metrics:
+                # Never measured: nothing to predict from
+                missing = np.full(len(X), np.nan)
+                predictions[metric_name] = missing
+                prediction_bounds[metric_name] = {'lower': missing, 'upper': missing}
+                continue
+            if isinstance(model, QuantileModel):
+                lower, predictions[metric_name], upper = model.predict_quantiles(X)
+                prediction_bounds[metric_name] = {'lower': lower, 'upper': upper}
+                continue
+            tree_predictions = np.stack([tree.predict(X) for tree in model.estimators_])
+            pred = tree_predictions.mean(axis=0)
+            std_dev = tree_predictions.std(axis=0)
             predictions[metric_name] = pred
-            
-            tree_predictions = np.array([tree.predict(features_df) for tree in model.estimators_])
-            std_dev = np.std(tree_predictions, axis=0)[0]
             prediction_bounds[metric_name] = {
                 'lower': pred - 2 * std_dev,
                 'upper': pred + 2 * std_dev
             }
-            
+        
         return {
             'predictions': predictions,
             'bounds': prediction_bounds,
-            'confidence_factors': self._calculate_confidence(features_df.iloc[0].to_dict())
+            'confidence_factors': self._calculate_confidence(X)
+        }
+
+    def _index_history(self):
+        """
+        Lay out the history for confidence scoring: only the features some metric weights,
+        one contiguous float32 row per feature, so each comparison streams through memory
+        """
+        self.confidence_features = np.flatnonzero(self.importance_matrix.any(axis=0))
+        self.history_columns = np.ascontiguousarray(self.history_rows[:, self.confidence_features].T,
+                                                    dtype=np.float32)
+        self.confidence_weights = self.importance_matrix[:, self.confidence_features].astype(np.float32)
+
+    def _calculate_confidence(self, X: np.ndarray, max_cells: int = 1 << 21) -> Dict[str, np.ndarray]:
+        """
+        Confidence per metric for each row of X: the share of 10 similar history cases
+        
+        A history case is similar when the importance-weighted share of features equal to
+        the row's exceeds 0.8. Equal history rows are compared once and weighted by count.
+        
+        Rows are compared in chunks of about max_cells rows x features x history rows
+        (at least one row), so memory stays bounded whatever the history and batch size.
+        """
+        X = np.asarray(X, dtype=np.float32)[:, self.confidence_features]
+        history = self.history_columns
+        counts = self.history_counts.astype(np.float32)
+        chunk_size = max(1, max_cells // max(history.size, 1))
+        similar_cases = np.zeros((len(X), len(self.confidence_weights)))
+        for start in range(0, len(X), chunk_size):
+            chunk = X[start:start + chunk_size]
+            # (rows, features, history rows) equality, weighted by importance per metric
+            equal = (chunk[:, :, None] == history[None, :, :]).astype(np.float32)
+            similar = (self.confidence_weights @ equal) > 0.8
+            similar_cases[start:start + chunk_size] = similar @ counts
+        
+        confidence = np.minimum(1.0, similar_cases / 10)
+        return {metric_name: confidence[:, i] for i, metric_name in enumerate(self.models)}
+
+    def save(self, filename: str):
+        """
+        Write the trained predictor to one uncompressed joblib file
+        
+        Arrays (tree nodes and values, the history index) are stored unpickled, so load()
+        can memory-map them; scikit-learn still copies the tree nodes into each tree.
+        """
+        state = {
+            'schema': {
+                'version': FEATURE_SCHEMA_VERSION,
+                'feature_columns': None if self.feature_columns is None else list(self.feature_columns),
+                'vocabulary': self.vocabulary.to_dict()
+            },
+            'retrain_every': self.retrain_every,
+            'retrain_interval': self.retrain_interval,
+            'models': self.models,
+            'fitted': self.last_fit_time is not None,
+            'pending_samples': self.pending_samples,
+            'history': self.history,
+            'feature_importance': self.feature_importance,
+            'history_rows': self.history_rows,
+            'history_counts': self.history_counts,
+            'importance_matrix': self.importance_matrix,
+            'unlabelled_metrics': sorted(self.unlabelled_metrics)
         }
+        joblib.dump(state, filename)
 
-    def _calculate_confidence(self, features: Dict) -> Dict[str, float]:
-        confidence_scores = {}
+    @classmethod
+    def load(cls, filename: str, n_jobs: Optional[int] = None, mmap: bool = True) -> 'PerformancePredictor':
+        """
+        Load a predictor written by save()
         
-        for metric_name, importance in self.feature_importance.items():
-            similar_cases = 0
-            for hist in self.history:
-                similarity = sum(
-                    imp * (hist['features'][feat] == features[feat])
-                    for feat, imp in importance.items()
-                )
-                if similarity > 0.8:
-                    similar_cases += 1
-                    
-            confidence_scores[metric_name] = min(1.0, similar_cases / 10)
+        :param n_jobs: Parallel jobs for later refits (not stored with the model)
+        :param mmap: Memory-map the arrays read-only instead of reading them into memory
+        :raises ValueError: If the file was written with another feature schema version
+        """
+        state = joblib.load(filename, mmap_mode='r' if mmap else None)
+        schema = state['schema']
+        if schema['version'] != FEATURE_SCHEMA_VERSION:
+            raise ValueError(f"{filename} uses feature schema version {schema['version']}, "
+                             f"expected {FEATURE_SCHEMA_VERSION}; retrain the model")
         
-        return confidence_scores
+        predictor = cls(n_jobs=n_jobs, retrain_every=state['retrain_every'],
+                        retrain_interval=state['retrain_interval'])
+        for model in state['models'].values():
+            if 'n_jobs' in model.get_params():
+                model.set_params(n_jobs=n_jobs)
+        predictor.models = state['models']
+        predictor.vocabulary = CategoricalVocabulary.from_dict(schema['vocabulary'])
+        if schema['feature_columns'] is not None:
+            predictor.feature_columns = pd.Index(schema['feature_columns'])
+        predictor.history = state['history']
+        predictor.feature_importance = state['feature_importance']
+        predictor.history_rows = state['history_rows']
+        predictor.history_counts = state['history_counts']
+        predictor.importance_matrix = state['importance_matrix']
+        if predictor.history_rows is not None:
+            predictor._index_history()
+        predictor.unlabelled_metrics = set(state.get('unlabelled_metrics', ()))
+        predictor.pending_samples = state['pending_samples']
+        if state['fitted']:
+            predictor.last_fit_time = time.monotonic()
+        return predictor
 
     def analyze_trends(self) -> Dict:
         trends = {}
@@ -336,16 +674,16 @@ def main():
     hardware, software, workload, historical_runs = create_example_data()
     
     print("\nTraining model with historical data...")
-    for run in historical_runs:
-        metrics = PerformanceMetrics()
-        metrics.update_from_dict(run['metrics'])
-        predictor.train(
-            hardware,
-            software,
-            workload,
-            run['background_processes'],
-            metrics
-        )
+    predictor.train_batch(
+        {
+            'hardware': hardware,
+            'software': software,
+            'workload': workload,
+            'background_processes': run['background_processes'],
+            'metrics': run['metrics']
+        }
+        for run in historical_runs
+    )
     
     print("\nMaking predictions for different scenarios...")
     test_scenarios = [
@@ -379,6 +717,13 @@ def main():
         for metric, confidence in prediction['confidence_factors'].items():
             print(f"  {metric}: {confidence:.2f}")
 
+    print(f"\n{'-'*60}")
+    print("\nSaving and reloading the trained model...")
+    predictor.save('predictor_model.joblib')
+    start = time.perf_counter()
+    predictor = PerformancePredictor.load('predictor_model.joblib')
+    print(f"  Loaded in {(time.perf_counter() - start) * 1000:.1f} ms")
+
     print(f"\n{'-'*60}")
     print("\nAnalyzing performance trends...")
     trends = predictor.analyze_trends()
@@ -0,0 +1,291 @@
+"""
+Local prediction service keeping a trained PerformancePredictor hot
+
+Loading pandas, scikit-learn and the forests takes seconds, so the Md-* schedulers and
+allocator extensions should not do it per invocation. This daemon loads a model saved
+with PerformancePredictor.save() once and answers over localhost HTTP. Requests that
+arrive within a short window are coalesced into one predict_batch call.
+
+    POST /predict  {"scenarios": [{"hardware": {...}, "software": {...},
+                                   "workload": {...}, "background_processes": 1}]}
+    -> {"results": [{"predictions": {...}, "bounds": {...}, "confidence_factors": {...}}]}
+    GET /health    -> {"status": "ok", "batches": ..., "scenarios": ...}
+
+hardware, software and workload hold the fields of HardwareProfile, SoftwareConfig and
+WorkloadProfile. Every field must have the type of its annotation, and numbers must be
+finite and non-negative (only the software priority may be negative); a request with an
+invalid scenario gets a 400 response. Each result has the same shape as
+PerformancePredictor.predict().
+
+Clients only need the standard library (see query()), so they start fast.
+
+Usage:
+    python3 predictor_service.py --model predictor_model.joblib --port 8765
+"""
+import argparse
+import dataclasses
+import json
+import math
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from queue import Empty, Queue
+from typing import Dict, List, Optional
+
+DEFAULT_PORT = 8765
+# Numeric scenario fields that may be negative (a nice-style priority)
+SIGNED_FIELDS = {'priority'}
+
+class InvalidScenario(ValueError):
+    """A scenario field has the wrong type or is out of range"""
+
+class PendingRequest:
+    def __init__(self, scenarios: List[Dict]):
+        """Scenarios of one HTTP request, waiting for their batch to be predicted"""
+        self.scenarios = scenarios
+        self.results: Optional[List[Dict]] = None
+        self.error: Optional[Exception] = None
+        self.done = threading.Event()
+
+class RequestCoalescer:
+    def __init__(self, predictor, window: float = 0.005, max_batch: int = 4096):
+        """
+        Collects concurrent requests and predicts them in one batch
+
+        Only the coalescer thread touches the predictor, so it needs no locking.
+
+        :param predictor: Trained PerformancePredictor
+        :param window: Seconds to wait for more requests after the first one arrives
+        :param max_batch: Scenarios after which a batch is run without waiting further
+        """
+        self.predictor = predictor
+        self.window = window
+        self.max_batch = max_batch
+        self.queue: Queue = Queue()
+        self.batches = 0
+        self.scenarios = 0
+        self._thread = threading.Thread(target=self._run, name='predictor-coalescer', daemon=True)
+        self._thread.start()
+
+    def submit(self, scenarios: List[Dict], timeout: Optional[float] = None) -> List[Dict]:
+        """Predict the scenarios of one request, blocking until its batch has run"""
+        request = PendingRequest(scenarios)
+        self.queue.put(request)
+        if not request.done.wait(timeout):
+            raise TimeoutError("Prediction batch did not finish in time")
+        if request.error is not None:
+            raise request.error
+        return request.results
+
+    def _run(self):
+        while True:
+            requests = [self.queue.get()]
+            try:
+                size = len(requests[0].scenarios)
+                deadline = time.monotonic() + self.window
+                while size < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        request = self.queue.get(timeout=remaining)
+                    except Empty:
+                        break
+                    requests.append(request)
+                    size += len(request.scenarios)
+                self._predict(requests)
+            except Exception as error:
+                # Never let one bad batch stop the thread every later request waits on
+                for request in requests:
+                    if not request.done.is_set():
+                        request.error = error
+                        request.done.set()
+
+    def _predict(self, requests: List[PendingRequest]):
+        # A malformed request fails on its own instead of failing the whole batch
+        decoded = []
+        for request in requests:
+            try:
+                decoded.append((request, [decode_scenario(s) for s in request.scenarios]))
+            except (KeyError, TypeError, InvalidScenario) as error:
+                request.error = error
+                request.done.set()
+        if not decoded:
+            return
+
+        scenarios = [scenario for _, request_scenarios in decoded for scenario in request_scenarios]
+        try:
+            batch = self.predictor.predict_batch(self.predictor.feature_matrix(scenarios))
+            results = split_results(batch, len(scenarios))
+        except Exception as error:
+            for request, _ in decoded:
+                request.error = error
+                request.done.set()
+            return
+
+        self.batches += 1
+        self.scenarios += len(scenarios)
+        offset = 0
+        for request, request_scenarios in decoded:
+            request.results = results[offset:offset + len(request_scenarios)]
+            offset += len(request_scenarios)
+            request.done.set()
+
+def check_number(name: str, value, kind: type):
+    """Raise InvalidScenario unless value is a finite int (or float, for kind float) in range"""
+    kinds = (int, float) if kind is float else int
+    if isinstance(value, bool) or not isinstance(value, kinds) or not math.isfinite(value):
+        raise InvalidScenario(f"{name} must be a finite {kind.__name__}, got {value!r}")
+    if value < 0 and name.rsplit('.', 1)[-1] not in SIGNED_FIELDS:
+        raise InvalidScenario(f"{name} must not be negative, got {value!r}")
+
+def decode_profile(cls: type, data: Dict):
+    """Profile dataclass from its JSON form, with every field checked against its annotation"""
+    if not isinstance(data, dict):
+        raise TypeError(f"{cls.__name__} must be an object")
+    profile = cls(**data)
+    for field in dataclasses.fields(cls):
+        name = f"{cls.__name__}.{field.name}"
+        value = getattr(profile, field.name)
+        if field.type is str:
+            if not isinstance(value, str):
+                raise InvalidScenario(f"{name} must be a string, got {value!r}")
+        elif field.type in (int, float):
+            check_number(name, value, field.type)
+        else:
+            # List[int] (cpu_affinity)
+            if not isinstance(value, list):
+                raise InvalidScenario(f"{name} must be a list, got {value!r}")
+            for item in value:
+                check_number(name, item, int)
+    return profile
+
+def decode_scenario(scenario: Dict) -> Dict:
+    """
+    Scenario dict for PerformancePredictor.feature_matrix from its JSON form
+
+    :raises KeyError, TypeError: A profile or field is missing, or a field is unknown
+    :raises InvalidScenario: A field has the wrong type or is out of range
+    """
+    from predictor import HardwareProfile, SoftwareConfig, WorkloadProfile
+    check_number('background_processes', scenario['background_processes'], int)
+    return {
+        'hardware': decode_profile(HardwareProfile, scenario['hardware']),
+        'software': decode_profile(SoftwareConfig, scenario['software']),
+        'workload': decode_profile(WorkloadProfile, scenario['workload']),
+        'background_processes': scenario['background_processes']
+    }
+
+def split_results(batch: Dict, count: int) -> List[Dict]:
+    """Per-scenario results in the predict() format from a predict_batch result"""
+    return [{
+        'predictions': {metric: float(values[i]) for metric, values in batch['predictions'].items()},
+        'bounds': {metric: {'lower': float(bounds['lower'][i]), 'upper': float(bounds['upper'][i])}
+                   for metric, bounds in batch['bounds'].items()},
+        'confidence_factors': {metric: float(values[i])
+                               for metric, values in batch['confidence_factors'].items()}
+    } for i in range(count)]
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    # The server provides coalescer (RequestCoalescer) and request_timeout (seconds)
+    server: 'PredictionServer'
+
+    def do_POST(self):
+        if self.path != '/predict':
+            self._send(404, {'error': f"Unknown path {self.path}"})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            scenarios = body['scenarios']
+        except (ValueError, KeyError, TypeError) as error:
+            self._send(400, {'error': f"Bad request: {error}"})
+            return
+        if not isinstance(scenarios, list) or not all(isinstance(s, dict) for s in scenarios):
+            self._send(400, {'error': "Bad request: scenarios must be a list of objects"})
+            return
+        try:
+            results = self.server.coalescer.submit(scenarios, self.server.request_timeout)
+        except (KeyError, TypeError, InvalidScenario) as error:
+            self._send(400, {'error': f"Bad scenario: {error}"})
+            return
+        except Exception as error:
+            self._send(500, {'error': str(error)})
+            return
+        self._send(200, {'results': results})
+
+    def do_GET(self):
+        if self.path != '/health':
+            self._send(404, {'error': f"Unknown path {self.path}"})
+            return
+        coalescer = self.server.coalescer
+        self._send(200, {'status': 'ok', 'batches': coalescer.batches, 'scenarios': coalescer.scenarios})
+
+    def _send(self, status: int, payload: Dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # One line per request would dominate the cost of small queries
+        pass
+
+class PredictionServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Schedulers may fire many queries at once; the default backlog of 5 resets them
+    request_queue_size = 128
+
+    def __init__(self, predictor, host: str = '127.0.0.1', port: int = DEFAULT_PORT,
+                 window: float = 0.005, timeout: float = 30.0):
+        """
+        :param predictor: Trained PerformancePredictor
+        :param host: Address to bind; keep it on localhost, there is no authentication
+        :param port: TCP port
+        :param window: Coalescing window in seconds
+        :param timeout: Seconds a request waits for its batch
+        """
+        super().__init__((host, port), PredictionHandler)
+        self.coalescer = RequestCoalescer(predictor, window)
+        self.request_timeout = timeout
+
+def query(scenarios: List[Dict], url: str = f'http://127.0.0.1:{DEFAULT_PORT}',
+          timeout: float = 30.0) -> List[Dict]:
+    """
+    Ask a running service for predictions
+
+    :param scenarios: JSON-form scenarios (see the module docstring)
+    :return: One predict()-format dict per scenario
+    """
+    request = urllib.request.Request(f'{url}/predict', data=json.dumps({'scenarios': scenarios}).encode(),
+                                     headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.load(response)['results']
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve PerformancePredictor estimates over localhost HTTP")
+    parser.add_argument("--model", required=True, help="Model file written by PerformancePredictor.save()")
+    parser.add_argument("--host", default='127.0.0.1', help="Address to bind")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="TCP port")
+    parser.add_argument("--window", type=float, default=0.005, help="Coalescing window in seconds")
+
+    args = parser.parse_args()
+
+    from predictor import PerformancePredictor
+    start = time.perf_counter()
+    predictor = PerformancePredictor.load(args.model)
+    print(f"Loaded {args.model} in {time.perf_counter() - start:.2f} s")
+
+    server = PredictionServer(predictor, args.host, args.port, args.window)
+    print(f"Serving predictions on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
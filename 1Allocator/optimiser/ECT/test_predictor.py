@@ -0,0 +1,62 @@
+"""
+Tests for the confidence scoring of PerformancePredictor
+
+Run with: python3 -m pytest test_predictor.py
+"""
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from predictor import PerformancePredictor
+
+def indexed_predictor(history_size: int, features: int = 20, seed: int = 0) -> PerformancePredictor:
+    """Predictor with a random history index, without fitting any model"""
+    rng = np.random.default_rng(seed)
+    predictor = PerformancePredictor()
+    predictor.history_rows, predictor.history_counts = np.unique(
+        rng.integers(0, 4, (history_size, features)).astype(np.float32), axis=0, return_counts=True)
+    importance = rng.random((len(predictor.models), features))
+    # Unused features and an unlabelled metric, as retrain() produces them
+    importance[:, :3] = 0
+    importance[-1] = 0
+    importance[:-1] /= importance[:-1].sum(axis=1, keepdims=True)
+    predictor.importance_matrix = importance
+    predictor._index_history()
+    return predictor
+
+def brute_force_confidence(predictor: PerformancePredictor, X: np.ndarray) -> np.ndarray:
+    """(rows, metrics) confidence from the full equality tensor"""
+    equal = X[:, None, :] == predictor.history_rows[None, :, :]
+    similar = (equal @ predictor.importance_matrix.T) > 0.8
+    return np.minimum(1.0, np.einsum('rhm,h->rm', similar, predictor.history_counts) / 10)
+
+def test_confidence_matches_brute_force_across_chunks():
+    predictor = indexed_predictor(3000)
+    rng = np.random.default_rng(1)
+    X = np.vstack([predictor.history_rows[:40], rng.integers(0, 4, (40, 20)).astype(np.float32)])
+    expected = brute_force_confidence(predictor, X)
+    # Several rows per chunk, and chunks smaller than one row
+    for max_cells in (1 << 21, 1):
+        confidence = predictor._calculate_confidence(X, max_cells=max_cells)
+        for i, metric_name in enumerate(predictor.models):
+            np.testing.assert_allclose(confidence[metric_name], expected[:, i])
+    assert (expected[:, -1] == 0).all()
+
+def test_confidence_time_and_memory_at_100k_history():
+    predictor = indexed_predictor(100_000)
+    rows = predictor.history_rows[np.random.default_rng(2).integers(0, len(predictor.history_rows), 256)]
+    predictor._calculate_confidence(rows[:1])
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    predictor._calculate_confidence(rows)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    # The full (rows, history, features) tensor would need gigabytes here
+    assert peak < 64 * 2**20
+    assert elapsed / len(rows) < 0.02
@@ -0,0 +1,218 @@
+"""
+Offline energy attribution from recorded plug power and allocator logs
+
+Joins the 1 Hz per-plug power CSVs written by 2Monitoring (timestamp, ..., p1..p20)
+with the slot allocate/release events in the emwos-allocator server log, and splits the
+dynamic energy of every node (power above its idle baseline) between the jobs holding
+its slots, in proportion to the number of busy slots at each sample.
+
+The plug CSVs do not say which node is on which plug, so a node -> column mapping is
+required (e.g. {"alpha": "p1", "bravo": "p2"}).
+
+Usage:
+    python3 attribution.py --power mwf2.csv --log mwf2-server.log --plug-map plugs.json \
+        --store historical_profiles.db
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from profile_store import ProfileStore
+
+# Add logs directory to Python path for reading compressed and archived server logs
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'logs'))
+from logparse import iter_log_lines
+
+# Add multi-wf directory to Python path for classifying jobs like the schedulers do
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..',
+                             'Energy-Aware-User-Prioritised-Preference-Scheduler', 'multi-wf'))
+from workflow_registry import classify_job, detect_family
+
+ALLOCATION_PATTERN = re.compile(r'^\[[^\]]*\] \[(\d+)\] Resource (\S+) (allocated to|released from) job (\S+)')
+
+# Percentile of a node's power series used as its idle baseline when none is given
+BASELINE_PERCENTILE = 5
+
+def read_power_csv(filename: str, columns: Iterable[str]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """
+    Read the timestamp and the given plug columns of a monitoring CSV
+
+    Rows may be short (plugs that did not answer yet); missing values become NaN.
+
+    :return: Sorted timestamps and one power array (Watts) per column
+    """
+    columns = list(columns)
+    with open(filename, 'r', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        positions = [header.index(column) for column in columns]
+        timestamps = []
+        values = []
+        for row in reader:
+            if not row or not row[0]:
+                continue
+            timestamps.append(float(row[0]))
+            values.append([float(row[p]) if p < len(row) and row[p] else np.nan for p in positions])
+
+    timestamps = np.array(timestamps)
+    values = np.array(values, dtype=float).reshape(len(timestamps), len(columns))
+    order = np.argsort(timestamps, kind='stable')
+    timestamps = timestamps[order]
+    values = values[order]
+    return timestamps, {column: values[:, i] for i, column in enumerate(columns)}
+
+def parse_allocations(lines: Iterable[str]) -> List[Dict]:
+    """
+    Slot intervals from allocator log lines
+
+    Each allocation is closed by the next release of the same slot; slots still held at
+    the end of the log are closed at the last timestamp seen.
+
+    :return: Dicts with slot, node, job, start and end (unix seconds)
+    """
+    open_slots = {}
+    intervals = []
+    last_timestamp = None
+    for line in lines:
+        match = ALLOCATION_PATTERN.match(line)
+        if not match:
+            continue
+        timestamp, slot, action, job = match.groups()
+        last_timestamp = int(timestamp)
+        if action == 'allocated to':
+            open_slots[slot] = (job, last_timestamp)
+        elif slot in open_slots:
+            allocated_job, start = open_slots.pop(slot)
+            intervals.append({'slot': slot, 'node': slot.split('@', 1)[-1], 'job': allocated_job,
+                              'start': start, 'end': last_timestamp})
+
+    for slot, (job, start) in open_slots.items():
+        intervals.append({'slot': slot, 'node': slot.split('@', 1)[-1], 'job': job,
+                          'start': start, 'end': last_timestamp})
+    return intervals
+
+def attribute_node(timestamps: np.ndarray, power: np.ndarray, baseline: float,
+                   starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """
+    Dynamic energy of each job interval on one node
+
+    Each sample covers the time up to the next one. Its energy above baseline is split
+    equally between the slots busy at that sample (start <= t < end), and every job gets
+    the sum of its shares, taken from a cumulative sum of the per-sample shares.
+
+    :param timestamps: Sorted sample times
+    :param power: Node power at each sample (Watts), NaN where missing
+    :param baseline: Idle power of the node (Watts)
+    :param starts: Interval start times
+    :param ends: Interval end times
+    :return: Energy (Joules) per interval
+    """
+    if len(timestamps) == 0 or len(starts) == 0:
+        return np.zeros(len(starts))
+
+    intervals = np.diff(timestamps)
+    step = np.median(intervals) if len(intervals) else 1.0
+    sample_energy = np.clip(np.nan_to_num(power - baseline), 0, None) * np.append(intervals, step)
+
+    busy = np.searchsorted(np.sort(starts), timestamps, side='right') - \
+        np.searchsorted(np.sort(ends), timestamps, side='right')
+    share = np.divide(sample_energy, busy, out=np.zeros_like(sample_energy), where=busy > 0)
+    cumulative = np.concatenate(([0.0], np.cumsum(share)))
+
+    return cumulative[np.searchsorted(timestamps, ends, side='left')] - \
+        cumulative[np.searchsorted(timestamps, starts, side='left')]
+
+def attribute_energy(timestamps: np.ndarray, node_power: Dict[str, np.ndarray], intervals: List[Dict],
+                     baseline_power: Optional[Dict[str, float]] = None) -> List[Dict]:
+    """
+    Attribute node dynamic energy to job intervals
+
+    :param timestamps: Sorted sample times
+    :param node_power: Node -> power array aligned with timestamps
+    :param intervals: Slot intervals from parse_allocations
+    :param baseline_power: Node -> idle power; defaults to a low percentile of the node's series
+    :return: The intervals of nodes with a power series, each with its 'energy' in Joules
+    """
+    baseline_power = baseline_power or {}
+    by_node = {}
+    for interval in intervals:
+        if interval['node'] in node_power:
+            by_node.setdefault(interval['node'], []).append(interval)
+
+    attributed = []
+    for node, node_intervals in by_node.items():
+        power = node_power[node]
+        baseline = baseline_power.get(node)
+        if baseline is None:
+            baseline = float(np.nanpercentile(power, BASELINE_PERCENTILE)) if np.isfinite(power).any() else 0.0
+        starts = np.array([i['start'] for i in node_intervals], dtype=float)
+        ends = np.array([i['end'] for i in node_intervals], dtype=float)
+        energy = attribute_node(timestamps, power, baseline, starts, ends)
+        for interval, joules in zip(node_intervals, energy):
+            attributed.append(dict(interval, energy=float(joules)))
+    return attributed
+
+def to_profile_runs(attributed: List[Dict], family: Optional[str] = None) -> List[Tuple[str, str, Dict, str]]:
+    """
+    (job_type, resource_id, run, job_id) tuples for ProfileStore.append_many
+
+    :param family: Workflow family for workflow_registry.classify_job (None: detect it per job)
+    """
+    runs = []
+    for interval in attributed:
+        run = {
+            'duration': float(interval['end'] - interval['start']),
+            'total_energy': interval['energy'],
+            'timestamp': datetime.fromtimestamp(interval['end']).isoformat()
+        }
+        job_type = classify_job(family or detect_family(interval['job']), interval['job'])
+        runs.append((job_type, interval['node'], run, interval['job']))
+    return runs
+
+def main():
+    parser = argparse.ArgumentParser(description="Attribute recorded plug power to jobs from allocator logs")
+    parser.add_argument("--power", required=True, help="Plug power CSV from 2Monitoring")
+    parser.add_argument("--log", required=True, help="emwos-allocator server log (.log, .gz or .tar.gz)")
+    parser.add_argument("--plug-map", required=True,
+                        help='JSON file mapping node to plug column, e.g. {"alpha": "p1"}')
+    parser.add_argument("--baseline", help="JSON file mapping node to idle power in Watts")
+    parser.add_argument("--family", help="Workflow family of the jobs (default: detect it from each job name)")
+    parser.add_argument("--store", help="Profile store (SQLite) to append the attributed runs to")
+    parser.add_argument("--output", help="CSV file for the attributed intervals")
+
+    args = parser.parse_args()
+
+    with open(args.plug_map, 'r') as f:
+        plug_map = json.load(f)
+    baseline_power = None
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline_power = json.load(f)
+
+    timestamps, columns = read_power_csv(args.power, plug_map.values())
+    node_power = {node: columns[column] for node, column in plug_map.items()}
+    intervals = parse_allocations(iter_log_lines(args.log))
+
+    attributed = attribute_energy(timestamps, node_power, intervals, baseline_power)
+    print(f"Attributed {sum(i['energy'] for i in attributed):.2f} J to {len(attributed)} of "
+          f"{len(intervals)} job intervals")
+
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['job', 'slot', 'node', 'start', 'end', 'energy'])
+            writer.writeheader()
+            writer.writerows(attributed)
+        print(f"Intervals written to {args.output}")
+
+    if args.store:
+        with ProfileStore(args.store) as store:
+            count = store.append_many(to_profile_runs(attributed, args.family))
+        print(f"Appended {count} runs to {args.store}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+import sys
+from models import EnergyEstimate
+from factor_index import FactorIndex
+from estimator import eec
+
+# Add parent directory to Python path for importing ect_function
+sys.path.append('../ECT/')
+from ect_function import ect
+
+def bucket(value: float, size: float) -> float:
+    """Quantize a load percentage to the centre of its bucket, kept within 0-100"""
+    if size <= 0:
+        return float(value)
+    return min(100.0, max(0.0, (int(value // size) + 0.5) * size))
+
+class EstimateCache:
+    def __init__(self, factor_index: Optional[FactorIndex] = None, max_entries: int = 10000,
+                 load_bucket: float = 5.0, ttl: Optional[float] = None):
+        """
+        Memoizing cache in front of ect() and eec()
+
+        CPU and network loads are quantized into buckets of load_bucket percent and the
+        estimate is computed at the bucket centre, so nearby load levels share one entry.
+        Entries of a (job type, resource) pair are dropped when the factor index records
+        new profiling data for that pair.
+
+        :param factor_index: Historical factors used for the estimates (empty if None)
+        :param max_entries: LRU capacity
+        :param load_bucket: Bucket width in percent (0 disables quantization)
+        :param ttl: Seconds an entry stays valid (None: until evicted or invalidated)
+        """
+        self.factor_index = factor_index if factor_index is not None else FactorIndex()
+        self.max_entries = max_entries
+        self.load_bucket = load_bucket
+        self.ttl = ttl
+        self.entries: OrderedDict = OrderedDict()
+        # (job type, resource id) -> keys of its entries, for invalidation
+        self.pair_keys: Dict[Tuple[str, str], Set[Tuple]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.factor_index.subscribe(self.invalidate)
+
+    def ect(self, job: Dict, resource: Dict, current_state: Dict, data_source: Dict,
+            network_info: Dict) -> float:
+        """Cached Estimated Completion Time (see ect_function.ect)"""
+        return self._get('ect', job, resource, current_state, data_source, network_info)
+
+    def eec(self, job: Dict, resource: Dict, current_state: Dict, data_source: Dict,
+            network_info: Dict) -> EnergyEstimate:
+        """Cached Estimated Energy Consumption (see estimator.eec)"""
+        return self._get('eec', job, resource, current_state, data_source, network_info)
+
+    def invalidate(self, job_type: str, resource_id: str):
+        """Drop all entries of a (job type, resource) pair"""
+        keys = self.pair_keys.pop((job_type, resource_id), ())
+        for key in keys:
+            if self.entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        """Drop all entries, keeping the counters"""
+        self.entries.clear()
+        self.pair_keys.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters and current size"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'size': len(self.entries)
+        }
+
+    def _get(self, kind: str, job: Dict, resource: Dict, current_state: Dict, data_source: Dict,
+             network_info: Dict):
+        cpu_load = bucket(current_state['cpu_load'], self.load_bucket)
+        source_load = bucket(data_source['cpu_load'], self.load_bucket)
+        network_load = bucket(network_info['load'], self.load_bucket)
+        pair = (job['type'], resource['id'])
+        # Transfers sharing the link change the ECT; the order they are listed in does not
+        concurrent = tuple(sorted(network_info.get('concurrent_transfers') or ()))
+        key = (kind, pair, job['cpu_instructions'], job['data_size'], resource['mips_performance'],
+               resource.get('base_power'), cpu_load, source_load, network_info['bandwidth'], network_load,
+               network_info.get('network_power'), concurrent)
+
+        entry = self.entries.get(key)
+        if entry is not None:
+            value, expires = entry
+            if expires is None or expires > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self._remove(key)
+
+        self.misses += 1
+        state = dict(current_state, cpu_load=cpu_load)
+        source = dict(data_source, cpu_load=source_load)
+        network = dict(network_info, load=network_load)
+        if kind == 'ect':
+            value = ect(job, resource, self.factor_index.time_factors, state, source, network)
+        else:
+            value = eec(job, resource, self.factor_index, state, source, network)
+
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        self.entries[key] = (value, expires)
+        self.pair_keys.setdefault(pair, set()).add(key)
+        while len(self.entries) > self.max_entries:
+            old_key, _ = self.entries.popitem(last=False)
+            self._discard_key(old_key)
+            self.evictions += 1
+        return value
+
+    def _remove(self, key: Tuple):
+        del self.entries[key]
+        self._discard_key(key)
+
+    def _discard_key(self, key: Tuple):
+        keys = self.pair_keys.get(key[1])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.pair_keys[key[1]]
@@ -1,12 +1,14 @@
 import json
-from typing import Dict, List
+import numpy as np
+from typing import Dict, List, Union
 import sys
 import os
-from models import EnergyEstimate
+from models import EnergyEstimate, ENERGY_ESTIMATE_DTYPE
+from factor_index import FactorIndex
 
 # Add parent directory to Python path for importing ect_function
 sys.path.append('../ECT/')
-from ect_function import ect
+from ect_function import ect, ect_batch, historical_matrix
 
 def prepare_historical_data_for_ect(historical_data: Dict) -> Dict:
     """
@@ -51,16 +53,21 @@ def estimate_transfer_energy(transfer_time: float, network_power: float) -> floa
     """Estimate energy consumption for data transfer"""
     return network_power * transfer_time
 
-def eec(job: Dict, resource: Dict, historical_data: Dict, current_state: Dict,
+def eec(job: Dict, resource: Dict, historical_data: Union[Dict, FactorIndex], current_state: Dict,
         data_source: Dict, network_info: Dict) -> EnergyEstimate:
     """
     Calculate Estimated Energy Consumption (EEC) for a job on a resource
+    
+    Pass a FactorIndex as historical_data to make the historical lookups O(1); raw
+    historical data is compiled into an index on every call.
     """
-    # Prepare historical data for ECT
-    ect_historical_data = prepare_historical_data_for_ect(historical_data)
+    if isinstance(historical_data, FactorIndex):
+        factor_index = historical_data
+    else:
+        factor_index = FactorIndex.from_historical_data(historical_data)
     
     # Get time estimate from ECT function
-    total_time = ect(job, resource, ect_historical_data, current_state, 
+    total_time = ect(job, resource, factor_index.time_factors, current_state, 
                     data_source, network_info)
     
     # Calculate transfer portion
@@ -81,7 +88,7 @@ def eec(job: Dict, resource: Dict, historical_data: Dict, current_state: Dict,
     load_factor = 1 + (current_state['cpu_load'] / 50)
     
     # Get energy factor from historical data
-    energy_factor = get_energy_factor(job, resource, historical_data)
+    energy_factor = factor_index.energy_factor(job['type'], resource['id'])
     
     compute_energy = base_power * compute_time * energy_factor * load_factor
     
@@ -96,6 +103,71 @@ def eec(job: Dict, resource: Dict, historical_data: Dict, current_state: Dict,
         duration=total_time
     )
 
+def eec_batch(jobs: List[Dict], resources: List[Dict], historical_data: Union[Dict, FactorIndex],
+              current_state: Union[Dict, List[Dict]], data_source: Union[Dict, List[Dict]],
+              network_info: Dict) -> np.ndarray:
+    """
+    Calculate Estimated Energy Consumption (EEC) for every job on every resource
+    
+    Same model as eec(), computed on the ect_batch completion-time matrix.
+    
+    :param jobs: Job dicts ('type', 'cpu_instructions', 'data_size')
+    :param resources: Resource dicts ('id', 'mips_performance', optional 'base_power')
+    :param historical_data: FactorIndex or raw historical data
+    :param current_state: State dict shared by all resources, or one per resource
+    :param data_source: Data source dict shared by all jobs, or one per job
+    :param network_info: Network information dict
+    :return: Structured array of shape (jobs, resources) with the EnergyEstimate fields
+    """
+    if isinstance(historical_data, FactorIndex):
+        factor_index = historical_data
+    else:
+        factor_index = FactorIndex.from_historical_data(historical_data)
+    
+    job_types = [job['type'] for job in jobs]
+    resource_ids = [resource['id'] for resource in resources]
+    states = current_state if isinstance(current_state, list) else [current_state] * len(resources)
+    sources = data_source if isinstance(data_source, list) else [data_source]
+    
+    cpu_instructions = np.array([job['cpu_instructions'] for job in jobs], dtype=float)
+    data_size = np.array([job['data_size'] for job in jobs], dtype=float)
+    cpu_load = np.array([state['cpu_load'] for state in states], dtype=float)
+    source_cpu_load = np.array([source['cpu_load'] for source in sources], dtype=float)
+    if len(sources) == 1:
+        source_cpu_load = source_cpu_load[0]
+    
+    # Get time estimates from the batch ECT function
+    total_time = ect_batch(
+        cpu_instructions, data_size,
+        [resource['mips_performance'] for resource in resources],
+        cpu_load, network_info['bandwidth'], network_info['load'], source_cpu_load,
+        historical_matrix(job_types, resource_ids, factor_index.time_factors)
+    )
+    
+    # Calculate transfer portion
+    data_ratio = (data_size / (data_size + cpu_instructions))[:, None]
+    transfer_time = total_time * data_ratio
+    compute_time = total_time * (1 - data_ratio)
+    
+    # Base power per resource, defaulting to 100W
+    base_power = np.array([resource.get('base_power', 100) for resource in resources], dtype=float)
+    
+    transfer_energy = estimate_transfer_energy(transfer_time, network_info.get('network_power', 20))
+    load_factor = 1 + (cpu_load / 50)
+    energy_factor = historical_matrix(job_types, resource_ids, factor_index.energy_factors())
+    compute_energy = base_power * compute_time * energy_factor * load_factor
+    
+    total_energy = transfer_energy + compute_energy
+    
+    estimates = np.empty(total_time.shape, dtype=ENERGY_ESTIMATE_DTYPE)
+    estimates['energy_joules'] = total_energy
+    estimates['average_watts'] = np.divide(total_energy, total_time, out=np.zeros_like(total_energy),
+                                           where=total_time > 0)
+    estimates['transfer_energy'] = transfer_energy
+    estimates['compute_energy'] = compute_energy
+    estimates['duration'] = total_time
+    return estimates
+
 # Example usage
 if __name__ == "__main__":
     # Example job matching ECT usage
@@ -153,11 +225,14 @@ if __name__ == "__main__":
         'network_power': 20
     }
 
+    # Compile the historical data once for all estimates
+    factor_index = FactorIndex.from_historical_data(historical_data)
+
     # Calculate estimates for each resource
     print("\nEnergy Estimates:")
     for resource in resources:
         estimate = eec(
-            job, resource, historical_data, current_state, 
+            job, resource, factor_index, current_state, 
             data_source, network_info
         )
         
@@ -166,4 +241,11 @@ if __name__ == "__main__":
         print(f"Average Power: {estimate.average_watts:.2f} Watts")
         print(f"Duration: {estimate.duration:.2f} seconds")
         print(f"Transfer Energy: {estimate.transfer_energy:.2f} Joules")
-        print(f"Compute Energy: {estimate.compute_energy:.2f} Joules")
\ No newline at end of file
+        print(f"Compute Energy: {estimate.compute_energy:.2f} Joules")
+
+    # Rank all resources at once with the batch estimator
+    estimates = eec_batch([job], resources, factor_index, current_state, data_source, network_info)
+    ranking = np.argsort(estimates['energy_joules'][0])
+    print("\nResources by estimated energy:")
+    for x in ranking:
+        print(f"{resources[x]['id']}: {estimates['energy_joules'][0, x]:.2f} Joules")
\ No newline at end of file
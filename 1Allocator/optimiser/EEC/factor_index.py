@@ -0,0 +1,143 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+@dataclass
+class FactorAggregate:
+    """Running aggregate of the profiled runs of one job type on one resource"""
+    count: int = 0
+    mean_duration: float = 0.0  # Seconds
+    mean_energy: float = 0.0  # Joules
+    baseline_duration: float = 0.0  # First run
+    baseline_energy: float = 0.0  # First run
+    fixed_time_factor: Optional[float] = None  # Set for precomputed factors, until a run is added
+    fixed_energy_factor: Optional[float] = None
+
+    def add(self, duration: float, total_energy: float):
+        """
+        Add one run, keeping the first run as baseline
+
+        Precomputed factors carry no baseline to continue from, so the first measured run
+        replaces them and the factors follow the running means from then on.
+        """
+        self.fixed_time_factor = None
+        self.fixed_energy_factor = None
+        if self.count == 0:
+            self.baseline_duration = duration
+            self.baseline_energy = total_energy
+        self.count += 1
+        self.mean_duration += (duration - self.mean_duration) / self.count
+        self.mean_energy += (total_energy - self.mean_energy) / self.count
+
+    @property
+    def time_factor(self) -> float:
+        """Average duration relative to the baseline run"""
+        if self.fixed_time_factor is not None:
+            return self.fixed_time_factor
+        if self.count == 0 or self.baseline_duration == 0:
+            return 1.0
+        return self.mean_duration / self.baseline_duration
+
+    @property
+    def energy_factor(self) -> float:
+        """Average energy relative to the baseline run"""
+        if self.fixed_energy_factor is not None:
+            return self.fixed_energy_factor
+        if self.count == 0 or self.baseline_energy == 0:
+            return 1.0
+        return self.mean_energy / self.baseline_energy
+
+class FactorIndex:
+    def __init__(self):
+        """
+        Compiled index of historical time and energy factors per (job type, resource).
+
+        Factors are kept as running aggregates and updated per recorded run, so lookups
+        do not depend on the size of the history.
+        """
+        self.aggregates: Dict[Tuple[str, str], FactorAggregate] = {}
+        # Time factors in the nested format expected by ect()
+        self.time_factors: Dict[str, Dict[str, float]] = {}
+        # Called with (job_type, resource_id) whenever the factors of a pair change
+        self.listeners: List[Callable[[str, str], None]] = []
+
+    @classmethod
+    def from_historical_data(cls, historical_data: Dict) -> 'FactorIndex':
+        """
+        Build an index from historical data as saved by the profiler
+
+        :param historical_data: job type -> resource id -> list of profiles,
+                                factor dictionary ('time_factor'/'energy_factor') or direct value
+        :return: Factor index
+        """
+        index = cls()
+        for job_type, resources in historical_data.items():
+            for resource_id, entry in resources.items():
+                if isinstance(entry, list):
+                    for profile in entry:
+                        index.add_run(job_type, resource_id, profile['duration'], profile['total_energy'])
+                elif isinstance(entry, dict):
+                    # Already a factor dictionary
+                    index.set_factors(job_type, resource_id,
+                                      entry.get('time_factor', 1.0), entry.get('energy_factor', 1.0))
+                else:
+                    # A direct time factor
+                    index.set_factors(job_type, resource_id, float(entry), 1.0)
+        return index
+
+    def add_run(self, job_type: str, resource_id: str, duration: float, total_energy: float) -> FactorAggregate:
+        """Record one profiled run and update the factors of its pair"""
+        aggregate = self.aggregates.setdefault((job_type, resource_id), FactorAggregate())
+        aggregate.add(duration, total_energy)
+        self.time_factors.setdefault(job_type, {})[resource_id] = aggregate.time_factor
+        self._notify(job_type, resource_id)
+        return aggregate
+
+    def set_factors(self, job_type: str, resource_id: str, time_factor: float, energy_factor: float):
+        """Store precomputed factors for a pair; the pair's next add_run supersedes them"""
+        self.aggregates[(job_type, resource_id)] = FactorAggregate(
+            fixed_time_factor=float(time_factor), fixed_energy_factor=float(energy_factor))
+        self.time_factors.setdefault(job_type, {})[resource_id] = float(time_factor)
+        self._notify(job_type, resource_id)
+
+    def set_aggregate(self, job_type: str, resource_id: str, aggregate: FactorAggregate):
+        """Store an aggregate computed elsewhere (e.g. by a profile store query)"""
+        self.aggregates[(job_type, resource_id)] = aggregate
+        self.time_factors.setdefault(job_type, {})[resource_id] = aggregate.time_factor
+        self._notify(job_type, resource_id)
+
+    def replace_all(self, other: 'FactorIndex'):
+        """Take over the factors of another index in place, notifying every pair it had or gets"""
+        pairs = set(self.aggregates) | set(other.aggregates)
+        self.aggregates = dict(other.aggregates)
+        self.time_factors = {job_type: dict(factors) for job_type, factors in other.time_factors.items()}
+        for job_type, resource_id in pairs:
+            self._notify(job_type, resource_id)
+
+    def subscribe(self, listener: Callable[[str, str], None]):
+        """Register a callback for factor changes of a (job type, resource) pair"""
+        self.listeners.append(listener)
+
+    def _notify(self, job_type: str, resource_id: str):
+        for listener in self.listeners:
+            listener(job_type, resource_id)
+
+    def get(self, job_type: str, resource_id: str) -> Optional[FactorAggregate]:
+        """Aggregate of a pair, or None if it was never profiled"""
+        return self.aggregates.get((job_type, resource_id))
+
+    def time_factor(self, job_type: str, resource_id: str) -> float:
+        """Historical time factor, 1.0 if unknown"""
+        aggregate = self.aggregates.get((job_type, resource_id))
+        return aggregate.time_factor if aggregate else 1.0
+
+    def energy_factor(self, job_type: str, resource_id: str) -> float:
+        """Historical energy factor, 1.0 if unknown"""
+        aggregate = self.aggregates.get((job_type, resource_id))
+        return aggregate.energy_factor if aggregate else 1.0
+
+    def energy_factors(self) -> Dict[str, Dict[str, float]]:
+        """Energy factors in the nested job type -> resource id format"""
+        energy_factors = {}
+        for (job_type, resource_id), aggregate in self.aggregates.items():
+            energy_factors.setdefault(job_type, {})[resource_id] = aggregate.energy_factor
+        return energy_factors
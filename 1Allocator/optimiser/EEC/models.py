@@ -1,6 +1,7 @@
 from datetime import datetime
 from typing import Dict, List, NamedTuple
 from dataclasses import dataclass
+import numpy as np
 
 class EnergyEstimate(NamedTuple):
     """Container for energy consumption estimates"""
@@ -10,6 +11,9 @@ class EnergyEstimate(NamedTuple):
     compute_energy: float
     duration: float
 
+# Structured array layout of EnergyEstimate, used by the batch estimator
+ENERGY_ESTIMATE_DTYPE = np.dtype([(field, np.float64) for field in EnergyEstimate._fields])
+
 @dataclass
 class EnergyProfile:
     """Store energy profiling data for a job"""
@@ -0,0 +1,190 @@
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+from factor_index import FactorAggregate, FactorIndex
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    job_type TEXT NOT NULL,
+    resource_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    duration REAL NOT NULL,
+    total_energy REAL NOT NULL,
+    avg_cpu_load REAL,
+    cpu_load_variance REAL,
+    job_id TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_pair_time ON runs (job_type, resource_id, timestamp);
+CREATE TABLE IF NOT EXISTS imports (
+    source TEXT PRIMARY KEY,
+    imported_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    run_count INTEGER NOT NULL
+);
+"""
+
+RUN_COLUMNS = ('job_type', 'resource_id', 'timestamp', 'duration', 'total_energy',
+               'avg_cpu_load', 'cpu_load_variance', 'job_id')
+INSERT_RUN = f"INSERT INTO runs ({', '.join(RUN_COLUMNS)}) VALUES ({', '.join('?' * len(RUN_COLUMNS))})"
+
+def run_row(job_type: str, resource_id: str, run: Dict, job_id: Optional[str] = None) -> Tuple:
+    """Row of the runs table for a profile record"""
+    return (job_type, resource_id, run['timestamp'], float(run['duration']), float(run['total_energy']),
+            run.get('avg_cpu_load'), run.get('cpu_load_variance'), job_id)
+
+class ProfileStore:
+    def __init__(self, filename: str = 'historical_profiles.db', timeout: float = 30.0):
+        """
+        Append-only store of profiled runs in SQLite (WAL mode)
+
+        Every profiling process opens its own store; WAL lets readers run alongside a
+        writer and concurrent writers wait up to timeout seconds for each other.
+
+        :param filename: Database file
+        :param timeout: Seconds to wait for the write lock
+        """
+        self.filename = filename
+        self.conn = sqlite3.connect(filename, timeout=timeout, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, job_type: str, resource_id: str, run: Dict, job_id: Optional[str] = None):
+        """
+        Append one profiled run
+
+        :param run: Profile record as produced by JobProfiler.end_profiling
+        """
+        self.append_many([(job_type, resource_id, run, job_id)])
+
+    def append_many(self, runs: Iterable[Tuple[str, str, Dict, Optional[str]]]) -> int:
+        """Append (job_type, resource_id, run, job_id) tuples in one transaction"""
+        rows = [run_row(*run) for run in runs]
+        with self._transaction():
+            self.conn.executemany(INSERT_RUN, rows)
+        return len(rows)
+
+    def import_json(self, filename: str) -> int:
+        """
+        Import a historical_profiles.json file once
+
+        :return: Number of runs imported (0 if the file was imported before)
+        """
+        source = os.path.abspath(filename)
+        with open(filename, 'r') as f:
+            profiles = json.load(f)
+
+        rows = [run_row(job_type, resource_id, run)
+                for job_type, resources in profiles.items()
+                for resource_id, resource_runs in resources.items()
+                for run in resource_runs]
+
+        with self._transaction():
+            if self.conn.execute('SELECT 1 FROM imports WHERE source = ?', (source,)).fetchone():
+                return 0
+            self.conn.executemany(INSERT_RUN, rows)
+            self.conn.execute('INSERT INTO imports (source, run_count) VALUES (?, ?)', (source, len(rows)))
+        return len(rows)
+
+    def runs(self, job_type: str, resource_id: str, since: Optional[str] = None,
+             until: Optional[str] = None) -> List[Dict]:
+        """Runs of a (job type, resource) pair in insertion order, optionally limited to a time range"""
+        query = ('SELECT timestamp, duration, total_energy, avg_cpu_load, cpu_load_variance, job_id '
+                 'FROM runs WHERE job_type = ? AND resource_id = ?')
+        params = [job_type, resource_id]
+        if since is not None:
+            query += ' AND timestamp >= ?'
+            params.append(since)
+        if until is not None:
+            query += ' AND timestamp < ?'
+            params.append(until)
+        cursor = self.conn.execute(query + ' ORDER BY id', params)
+        columns = [c[0] for c in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def aggregates(self, job_type: Optional[str] = None) -> List[Dict]:
+        """
+        Per-(job type, resource) aggregates, the first run of each pair being its baseline
+
+        :param job_type: Limit to one job type
+        :return: Dicts with job_type, resource_id, count, mean_duration, mean_energy,
+                 mean_cpu_load, baseline_duration and baseline_energy
+        """
+        where = 'WHERE job_type = ?' if job_type is not None else ''
+        params = (job_type,) if job_type is not None else ()
+        cursor = self.conn.execute(f"""
+            SELECT a.job_type, a.resource_id, a.count, a.mean_duration, a.mean_energy, a.mean_cpu_load,
+                   b.duration AS baseline_duration, b.total_energy AS baseline_energy
+            FROM (SELECT job_type, resource_id, COUNT(*) AS count, MIN(id) AS first_id,
+                         AVG(duration) AS mean_duration, AVG(total_energy) AS mean_energy,
+                         AVG(avg_cpu_load) AS mean_cpu_load
+                  FROM runs {where} GROUP BY job_type, resource_id) a
+            JOIN runs b ON b.id = a.first_id
+        """, params)
+        columns = [c[0] for c in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def factor_index(self) -> FactorIndex:
+        """Build a FactorIndex from the aggregates without loading individual runs"""
+        index = FactorIndex()
+        for row in self.aggregates():
+            index.set_aggregate(row['job_type'], row['resource_id'], FactorAggregate(
+                count=row['count'],
+                mean_duration=row['mean_duration'],
+                mean_energy=row['mean_energy'],
+                baseline_duration=row['baseline_duration'],
+                baseline_energy=row['baseline_energy']
+            ))
+        return index
+
+    def load_profiles(self) -> Dict:
+        """All runs in the historical_profiles.json format"""
+        profiles = {}
+        cursor = self.conn.execute(
+            'SELECT job_type, resource_id, duration, total_energy, avg_cpu_load, cpu_load_variance, timestamp '
+            'FROM runs ORDER BY id')
+        for job_type, resource_id, duration, total_energy, avg_cpu_load, cpu_load_variance, timestamp in cursor:
+            run = {'duration': duration, 'total_energy': total_energy, 'avg_cpu_load': avg_cpu_load}
+            if cpu_load_variance is not None:
+                run['cpu_load_variance'] = cpu_load_variance
+            run['timestamp'] = timestamp
+            profiles.setdefault(job_type, {}).setdefault(resource_id, []).append(run)
+        return profiles
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction that takes the lock up front, so concurrent writers queue instead of failing"""
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+        self.conn.execute('COMMIT')
+
+# Example usage
+if __name__ == "__main__":
+    with ProfileStore('historical_profiles.db') as store:
+        # One-time import of the JSON profiles
+        imported = store.import_json('historical_profiles.json')
+        print(f"Imported {imported} runs from historical_profiles.json")
+
+        print("\nAggregates:")
+        for row in store.aggregates():
+            print(f"{row['job_type']} on {row['resource_id']}: {row['count']} runs, "
+                  f"mean duration {row['mean_duration']:.2f} s, mean energy {row['mean_energy']:.2f} J")
+
+        factor_index = store.factor_index()
+        print("\nTime factors (ECT format):")
+        print(json.dumps(factor_index.time_factors, indent=2))
@@ -3,7 +3,10 @@ from datetime import datetime
 import numpy as np
 from typing import Dict, List, Tuple, Optional
 import time
+from collections import deque
 from models import EnergyProfile
+from factor_index import FactorIndex
+from profile_store import ProfileStore
 
 class NumpyEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -18,50 +21,112 @@ class NumpyEncoder(json.JSONEncoder):
         return super(NumpyEncoder, self).default(obj)
 
 class JobProfiler:
-    def __init__(self, baseline_power: Dict[str, float]):
+    def __init__(self, baseline_power: Dict[str, float], raw_sample_limit: int = 0,
+                 store: Optional[ProfileStore] = None):
         """
         Initialize the job profiler
         
         :param baseline_power: Dictionary of resource_id to baseline power consumption in Watts
+        :param raw_sample_limit: Number of most recent raw samples kept per job (0 keeps none)
+        :param store: Profile store every finished run is appended to; its aggregates
+                      seed the factor index
         """
         self.baseline_power = {k: float(v) for k, v in baseline_power.items()}
+        self.raw_sample_limit = raw_sample_limit
         self.profiles = {}
+        # Running time/energy factors, updated with every recorded run
+        self.factor_index = store.factor_index() if store else FactorIndex()
+        self.store = store
         
-    def start_profiling(self, job_id: str, job_type: str, resource_id: str) -> dict:
+    def start_profiling(self, job_id: str, job_type: str, resource_id: str,
+                        timestamp: Optional[float] = None) -> dict:
         """
         Start profiling a job
         
+        Measurements are integrated as they arrive, so the profile has a constant size
+        however long the job runs.
+        
         :param job_id: Unique identifier for the job
         :param job_type: Type/category of the job
         :param resource_id: ID of the resource being used
+        :param timestamp: Start time in seconds since the epoch (default: now)
         :return: Profile dictionary for tracking measurements
         """
+        start = time.time() if timestamp is None else float(timestamp)
         return {
             'job_id': job_id,
             'job_type': job_type,
             'resource_id': resource_id,
-            'start_time': datetime.now(),
-            'energy_readings': [],
-            'cpu_loads': []
+            'start_time': datetime.fromtimestamp(start),
+            'start_timestamp': start,
+            'baseline': self.baseline_power.get(resource_id, 0),
+            # Energy above baseline integrated so far, and the sample it ends at
+            'energy': 0.0,
+            'first_sample': None,
+            'last_sample': None,
+            # Welford accumulators for the CPU load
+            'cpu_count': 0,
+            'cpu_mean': 0.0,
+            'cpu_m2': 0.0,
+            # Most recent raw samples as (timestamp, reading, cpu loads)
+            'raw_samples': deque(maxlen=self.raw_sample_limit)
         }
 
-    def record_measurement(self, profile: dict, energy_reading: float, cpu_loads: List[float]):
-        """Record a single measurement"""
-        profile['energy_readings'].append(float(energy_reading))
-        profile['cpu_loads'].append([float(x) for x in cpu_loads])
+    def record_measurement(self, profile: dict, energy_reading: float, cpu_loads: List[float],
+                           timestamp: Optional[float] = None):
+        """
+        Record a single measurement
+        
+        :param energy_reading: Power reading in Watts
+        :param cpu_loads: CPU load percentage per thread
+        :param timestamp: Sample time in seconds since the epoch (default: now)
+        """
+        sample_time = time.time() if timestamp is None else float(timestamp)
+        power = float(energy_reading) - profile['baseline']
+        
+        # Trapezoidal integration between consecutive samples
+        if profile['last_sample'] is None:
+            profile['first_sample'] = (sample_time, power)
+        else:
+            last_time, last_power = profile['last_sample']
+            profile['energy'] += (sample_time - last_time) * (power + last_power) / 2
+        profile['last_sample'] = (sample_time, power)
+        
+        # Merge this sample's per-thread loads into the running mean/variance
+        loads = np.asarray(cpu_loads, dtype=float)
+        if loads.size:
+            count = profile['cpu_count'] + loads.size
+            sample_mean = float(loads.mean())
+            delta = sample_mean - profile['cpu_mean']
+            profile['cpu_m2'] += float(((loads - sample_mean) ** 2).sum()) + \
+                delta ** 2 * profile['cpu_count'] * loads.size / count
+            profile['cpu_mean'] += delta * loads.size / count
+            profile['cpu_count'] = count
+        
+        profile['raw_samples'].append((sample_time, float(energy_reading), loads.tolist()))
 
-    def end_profiling(self, profile: dict) -> Tuple[float, float]:
-        """End profiling and calculate factors"""
-        profile['end_time'] = datetime.now()
-        duration = (profile['end_time'] - profile['start_time']).total_seconds()
+    def end_profiling(self, profile: dict, timestamp: Optional[float] = None) -> Tuple[float, float]:
+        """
+        End profiling and calculate factors
+        
+        The first and last readings are held out to the start and end of the job.
+        
+        :param timestamp: End time in seconds since the epoch (default: now)
+        """
+        end = time.time() if timestamp is None else float(timestamp)
+        profile['end_time'] = datetime.fromtimestamp(end)
+        duration = end - profile['start_timestamp']
         resource_id = profile['resource_id']
         
-        energy_readings = np.array(profile['energy_readings'])
-        baseline = self.baseline_power.get(resource_id, 0)
-        total_energy = float(np.sum(energy_readings - baseline))
+        total_energy = profile['energy']
+        if profile['first_sample'] is not None:
+            first_time, first_power = profile['first_sample']
+            last_time, last_power = profile['last_sample']
+            total_energy += max(first_time - profile['start_timestamp'], 0) * first_power
+            total_energy += max(end - last_time, 0) * last_power
         
-        cpu_loads = np.array(profile['cpu_loads'])
-        avg_cpu_load = float(np.mean(cpu_loads))
+        avg_cpu_load = profile['cpu_mean']
+        cpu_load_variance = profile['cpu_m2'] / profile['cpu_count'] if profile['cpu_count'] else 0.0
         
         job_type = profile['job_type']
         if job_type not in self.profiles:
@@ -69,47 +134,38 @@ class JobProfiler:
         
         if resource_id not in self.profiles[job_type]:
             self.profiles[job_type][resource_id] = []
+        
+        aggregate = self.factor_index.get(job_type, resource_id)
+        if aggregate is None or aggregate.count == 0:
             time_factor = 1.0
             energy_factor = 1.0
         else:
             # Calculate factors based on first run as baseline
-            baseline_profile = self.profiles[job_type][resource_id][0]
-            time_factor = duration / baseline_profile['duration']
-            energy_factor = total_energy / baseline_profile['total_energy']
+            time_factor = duration / aggregate.baseline_duration
+            energy_factor = total_energy / aggregate.baseline_energy
         
-        self.profiles[job_type][resource_id].append({
+        run = {
             'duration': float(duration),
             'total_energy': float(total_energy),
             'avg_cpu_load': float(avg_cpu_load),
+            'cpu_load_variance': float(cpu_load_variance),
             'timestamp': profile['end_time'].isoformat()
-        })
+        }
+        self.profiles[job_type][resource_id].append(run)
+        self.factor_index.add_run(job_type, resource_id, float(duration), float(total_energy))
+        if self.store:
+            self.store.append(job_type, resource_id, run, profile['job_id'])
         
         return time_factor, energy_factor
 
     def get_historical_data(self) -> Dict:
         """Convert profiles to format matching ECT usage"""
-        historical_data = {}
-        for job_type, resources in self.profiles.items():
-            historical_data[job_type] = {}
-            for resource_id, profiles in resources.items():
-                if profiles:
-                    # Use the average time factor relative to first run
-                    baseline_duration = profiles[0]['duration']
-                    avg_duration = np.mean([p['duration'] for p in profiles])
-                    historical_data[job_type][resource_id] = float(avg_duration / baseline_duration)
-        return historical_data
+        # Average time factor relative to first run, from the factor index
+        return {job_type: dict(factors) for job_type, factors in self.factor_index.time_factors.items()}
 
     def get_energy_factors(self) -> Dict:
         """Get energy factors for all profiled jobs and resources"""
-        energy_factors = {}
-        for job_type, resources in self.profiles.items():
-            energy_factors[job_type] = {}
-            for resource_id, profiles in resources.items():
-                if profiles:
-                    baseline_energy = profiles[0]['total_energy']
-                    avg_energy = np.mean([p['total_energy'] for p in profiles])
-                    energy_factors[job_type][resource_id] = float(avg_energy / baseline_energy)
-        return energy_factors
+        return self.factor_index.energy_factors()
 
     def save_profiles(self, filename: str):
         """Save profiles to a JSON file"""
@@ -120,6 +176,8 @@ class JobProfiler:
         """Load profiles from a JSON file"""
         with open(filename, 'r') as f:
             self.profiles = json.load(f)
+        # Rebuilt in place, so caches subscribed to the index are invalidated rather than orphaned
+        self.factor_index.replace_all(FactorIndex.from_historical_data(self.profiles))
 
 # Example usage
 if __name__ == "__main__":
@@ -137,18 +195,18 @@ if __name__ == "__main__":
     
     # Example profiling for mProject on different resources
     for resource in resources:
-        profile = profiler.start_profiling('mProject_1', 'mProject', resource['id'])
+        start = time.time()
+        profile = profiler.start_profiling('mProject_1', 'mProject', resource['id'], start)
         
-        # Simulate job execution and measurements
-        for _ in range(5):  # 5 second job
+        # Simulate job execution and measurements, one sample per second
+        for second in range(5):  # 5 second job
             # Simulate energy reading (base power + load)
             energy_reading = resource['base_power'] * 1.5  # 50% above baseline
             cpu_loads = [60, 70, 65, 55, 0, 0, 0, 0]
             
-            profiler.record_measurement(profile, energy_reading, cpu_loads)
-            time.sleep(1)
+            profiler.record_measurement(profile, energy_reading, cpu_loads, start + second)
         
-        time_factor, energy_factor = profiler.end_profiling(profile)
+        time_factor, energy_factor = profiler.end_profiling(profile, start + 5)
         print(f"\nResource {resource['id']}:")
         print(f"Time Factor: {time_factor:.2f}")
         print(f"Energy Factor: {energy_factor:.2f}")
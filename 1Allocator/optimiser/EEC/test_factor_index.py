@@ -0,0 +1,42 @@
+"""
+Tests for the incremental factor index
+
+Run with: python3 -m pytest test_factor_index.py
+"""
+import os
+import sys
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from factor_index import FactorIndex
+
+def test_running_means_follow_added_runs():
+    index = FactorIndex()
+    index.add_run('mProject', 'slot1@alpha', 10.0, 100.0)
+    index.add_run('mProject', 'slot1@alpha', 20.0, 300.0)
+    assert index.time_factor('mProject', 'slot1@alpha') == pytest.approx(1.5)
+    assert index.energy_factor('mProject', 'slot1@alpha') == pytest.approx(2.0)
+    assert index.time_factors == {'mProject': {'slot1@alpha': pytest.approx(1.5)}}
+
+def test_added_runs_supersede_precomputed_factors():
+    index = FactorIndex.from_historical_data({'mProject': {'slot1@alpha': {'time_factor': 1.3,
+                                                                           'energy_factor': 0.7}}})
+    changed = []
+    index.subscribe(lambda job_type, resource_id: changed.append((job_type, resource_id)))
+    assert index.time_factor('mProject', 'slot1@alpha') == pytest.approx(1.3)
+
+    index.add_run('mProject', 'slot1@alpha', 10.0, 100.0)
+    index.add_run('mProject', 'slot1@alpha', 30.0, 200.0)
+
+    assert index.time_factor('mProject', 'slot1@alpha') == pytest.approx(2.0)
+    assert index.energy_factor('mProject', 'slot1@alpha') == pytest.approx(1.5)
+    assert index.time_factors['mProject']['slot1@alpha'] == pytest.approx(2.0)
+    assert index.energy_factors()['mProject']['slot1@alpha'] == pytest.approx(1.5)
+    assert changed == [('mProject', 'slot1@alpha')] * 2
+
+def test_precomputed_factors_of_other_pairs_are_kept():
+    index = FactorIndex()
+    index.set_factors('mProject', 'slot1@alpha', 1.3, 0.7)
+    index.add_run('mProject', 'slot1@beta', 10.0, 100.0)
+    assert index.time_factor('mProject', 'slot1@alpha') == pytest.approx(1.3)
+    assert index.energy_factor('mProject', 'slot1@alpha') == pytest.approx(0.7)